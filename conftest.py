@@ -0,0 +1,25 @@
+import shutil
+
+import pytest
+
+
+def pytest_configure(config):
+    """Свой файл кэша на каждый запуск, как у manage.py test
+    (core.test_runner)."""
+    from core.test_runner import temp_cache
+    config.cache_settings, config.cache_directory = temp_cache()
+    config.cache_settings.enable()
+
+
+def pytest_unconfigure(config):
+    config.cache_settings.disable()
+    shutil.rmtree(config.cache_directory, ignore_errors=True)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Миниатюры, поставленные тестом в очередь, успевают создаться до
+    teardown: иначе поток пишет в уже удаляемый временный MEDIA_ROOT."""
+    yield
+    from core import thumbnails
+    thumbnails.wait_idle()
@@ -0,0 +1,123 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+from . import views
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(views.PAGE_SIZE + 5):
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Пост {number}',
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def walk(self, url, client=None):
+        """id постов со всех страниц ленты."""
+        client = client or self.client
+        ids = []
+        while url:
+            data = client.get(url).json()
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+        return ids
+
+    def test_timelines(self):
+        """Ленты отдают все посты по порядку, курсором по страницам."""
+        posts = Post.objects.order_by('-pub_date', '-id')
+        timelines = {
+            reverse('api:posts'): posts,
+            reverse('api:group_posts', args=('group',)):
+                posts.filter(group=self.group),
+            reverse('api:profile_posts', args=('author',)):
+                posts.filter(author=self.author),
+        }
+        for url, expected in timelines.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.walk(url),
+                    list(expected.values_list('id', flat=True)),
+                )
+        self.assertEqual(
+            self.walk(reverse('api:follow_posts'), self.reader_client),
+            list(posts.values_list('id', flat=True)),
+        )
+
+    def test_listing_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('api:posts')).json()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"posts_post"."text"', queries[0]['sql'])
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        self.assertEqual(data['results'][0], {
+            'id': post.id,
+            'excerpt': post.excerpt,
+            'pub_date': DjangoJSONEncoder().default(post.pub_date),
+            'author': 'author',
+            'group': None,
+            'comments_count': 0,
+            'image': None,
+        })
+
+    def test_post_detail(self):
+        post = Post.objects.filter(group=self.group).first()
+        data = self.client.get(
+            reverse('api:post_detail', args=(post.id,))
+        ).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['text_html'], post.text_html)
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(
+            self.client.get(data['comments']).json(),
+            {'comments': [], 'next': None},
+        )
+
+    def test_not_found(self):
+        for url in (
+            reverse('api:post_detail', args=(0,)),
+            reverse('api:group_posts', args=('missing',)),
+            reverse('api:profile_posts', args=('missing',)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
+
+    def test_follow_posts_requires_login(self):
+        response = self.client.get(reverse('api:follow_posts'))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_cache_headers(self):
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        self.assertIn(f'max-age={views.MAX_AGE}', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.reader_client.get(reverse('api:follow_posts'))
+        self.assertIn('private', response['Cache-Control'])
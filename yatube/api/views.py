@@ -0,0 +1,121 @@
+"""JSON-версия лент и страницы поста, только для чтения.
+
+Строки читаются через values() — без моделей и шаблонов, ленты листаются
+тем же курсором, что и на сайте, а ответы кэшируются и проверяются по
+ETag с теми же тегами, что и HTML-страницы.
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+
+from core.cache import cache_page_tagged, etag_tagged
+from core.paginator import CursorPaginator
+from posts.models import Group, Post, User
+from posts.views import (
+    group_tags, index_tags, post_tags_by_id, profile_tags,
+)
+
+PAGE_SIZE = 20
+# Сколько секунд клиент может не перепроверять публичную ленту
+MAX_AGE = 60
+# Поля поста в лентах: анонс вместо полного текста
+LISTING_FIELDS = (
+    'id', 'excerpt', 'pub_date', 'image', 'comments_count',
+    'author__username', 'group__slug',
+)
+
+
+def serialize(row, prefix=''):
+    """Пост из строки values(); prefix — путь до полей поста."""
+    image = row[prefix + 'image']
+    return {
+        'id': row[prefix + 'id'],
+        'excerpt': row[prefix + 'excerpt'],
+        'pub_date': row[prefix + 'pub_date'],
+        'author': row[prefix + 'author__username'],
+        'group': row[prefix + 'group__slug'],
+        'comments_count': row[prefix + 'comments_count'],
+        'image': settings.MEDIA_URL + image if image else None,
+    }
+
+
+def timeline(request, rows, prefix=''):
+    """Страница ленты: {'results': [...], 'next': адрес или None}."""
+    paginator = CursorPaginator(rows, PAGE_SIZE, offset_pages=1)
+    page = paginator.get_page(
+        request.GET.get('page'), after=request.GET.get('after')
+    )
+    return JsonResponse({
+        'results': [serialize(row, prefix) for row in page],
+        'next': (
+            f'{request.path}?{page.next_query}' if page.next_query else None
+        ),
+    })
+
+
+def not_found():
+    return JsonResponse({'detail': 'Не найдено'}, status=404)
+
+
+@cache_control(public=True, max_age=MAX_AGE)
+@etag_tagged(index_tags)
+@cache_page_tagged(index_tags)
+def posts(request):
+    return timeline(request, Post.objects.values(*LISTING_FIELDS))
+
+
+@cache_control(public=True, max_age=MAX_AGE)
+@etag_tagged(group_tags)
+@cache_page_tagged(group_tags)
+def group_posts(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return not_found()
+    return timeline(
+        request,
+        Post.objects.filter(group__slug=slug).values(*LISTING_FIELDS),
+    )
+
+
+@cache_control(public=True, max_age=MAX_AGE)
+@etag_tagged(profile_tags)
+@cache_page_tagged(profile_tags)
+def profile_posts(request, username):
+    if not User.objects.filter(username=username).exists():
+        return not_found()
+    return timeline(
+        request,
+        Post.objects.filter(author__username=username).values(
+            *LISTING_FIELDS
+        ),
+    )
+
+
+@cache_control(private=True)
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужно войти'}, status=403)
+    # Лента из FeedEntry; курсор — по дате и id записи ленты
+    rows = request.user.feed_entries.values(
+        'id', 'pub_date', *(f'post__{field}' for field in LISTING_FIELDS)
+    )
+    return timeline(request, rows, prefix='post__')
+
+
+@cache_control(public=True, max_age=MAX_AGE)
+@etag_tagged(post_tags_by_id)
+@cache_page_tagged(post_tags_by_id)
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(
+        'text', 'text_html', *LISTING_FIELDS
+    ).first()
+    if row is None:
+        return not_found()
+    post = serialize(row)
+    post.update(
+        text=row['text'],
+        text_html=row['text_html'],
+        comments=reverse('posts:post_comments', args=(post_id,))
+        + '?format=json',
+    )
+    return JsonResponse(post)
@@ -0,0 +1,285 @@
+import hashlib
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from . import compression
+
+# Сколько секунд запрос может перестраивать страницу, держа блокировку
+LOCK_TIMEOUT = 30
+# Сколько ждёт запрос без копии страницы, пока её строит другой
+LOCK_WAIT = 5
+# Доля TTL, на которую случайно сокращается срок свежести записи
+JITTER = 0.1
+# Сколько устаревшая запись живёт после срока свежести, чтобы её можно
+# было отдать, пока страницу перестраивают
+STALE_TTL = 60 * 10
+# Cookie read_your_writes и сколько секунд после записи посетитель не
+# получает устаревших копий страниц
+DIRTY_COOKIE = 'wrote'
+DIRTY_TTL = 60
+
+
+def _tag_key(tag):
+    return f'cache-tag:{tag}'
+
+
+def _initial_version():
+    # Версия тега, вытесненного из кэша, начинается с текущего времени,
+    # чтобы не совпасть с версией, под которой лежат старые записи.
+    return int(time.time() * 1000)
+
+
+def tags_version(tags):
+    """Отпечаток текущих версий тегов, например '1697...1.1697...7'."""
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {
+        key: _initial_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_tags(*tags):
+    """Сбрасывает всё, что закэшировано с любым из тегов.
+
+    SQLiteCache увеличивает все версии одной транзакцией (incr_many):
+    тегов бывает много, например лент всех подписчиков автора.
+    """
+    keys = [_tag_key(tag) for tag in set(tags)]
+    if hasattr(cache, 'incr_many'):
+        bumped = cache.incr_many(keys)
+    else:
+        bumped = {}
+        for key in keys:
+            try:
+                bumped[key] = cache.incr(key)
+            except ValueError:
+                pass
+    missing = [key for key in keys if key not in bumped]
+    if missing:
+        cache.set_many(
+            {key: _initial_version() for key in missing}, None
+        )
+
+
+def bump_tags_on_commit(*tags):
+    """bump_tags() для записи, сделанной в транзакции.
+
+    Кэш общий для процессов, и до коммита другой запрос может построить
+    страницу по старым данным и сохранить её под уже новой версией.
+    Поэтому теги сбрасываются ещё раз после коммита; сброс сразу
+    оставлен, чтобы сама транзакция не читала из кэша старое.
+    """
+    if transaction.get_connection().in_atomic_block:
+        bump_tags(*tags)
+    transaction.on_commit(lambda: bump_tags(*tags))
+
+
+def _page_tags(tags, request, *args, **kwargs):
+    """tags() один раз на запрос: его зовут и etag_tagged, и
+    cache_page_tagged, а теги могут стоить запроса к БД."""
+    memo = request.__dict__.setdefault('_page_tags', {})
+    if tags not in memo:
+        memo[tags] = tags(request, *args, **kwargs)
+    return memo[tags]
+
+
+def page_key(request):
+    """Ключ страницы: один на адрес, без Vary: Cookie.
+
+    Всё, что зависит от посетителя, страница выводит через
+    {% hole %} (см. core.holes), поэтому копия в кэше общая для гостей
+    и вошедших пользователей.
+
+    Хоста и схемы в ключе нет: страницы ссылаются только на пути, а
+    прогрев кэша (manage.py warm_cache) иначе не попадал бы в ключи
+    посетителей, пришедших по https или на другое имя сайта.
+    """
+    path = request.get_full_path().encode()
+    return 'tagged.' + hashlib.md5(path).hexdigest()
+
+
+def _wait_for_fill(cache_key):
+    """Ждёт, пока страницу построит запрос, взявший блокировку."""
+    deadline = time.monotonic() + LOCK_WAIT
+    lock_key = cache_key + '.lock'
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(0.05)
+    return cache.get(cache_key)
+
+
+def _is_fresh(entry, version):
+    entry_version, fresh_until, response = entry
+    return entry_version == version and time.time() < fresh_until
+
+
+def _lookup(cache_key, version, allow_stale=True):
+    """(ответ из кэша, None) или (None, ключ блокировки, если её взяли).
+
+    У устаревшей копии, отданной вместо свежей, атрибут stale = True.
+    allow_stale=False — устаревшую копию не отдавать и не ждать чужой
+    перестройки.
+    """
+    entry = cache.get(cache_key)
+    if entry is not None and _is_fresh(entry, version):
+        return entry[2], None
+    lock_key = cache_key + '.lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return None, lock_key
+    if not allow_stale:
+        return None, None
+    if entry is None:
+        entry = _wait_for_fill(cache_key)
+    if entry is not None:
+        response = entry[2]
+        response.stale = not _is_fresh(entry, version)
+        return response, None
+    # Блокировка так и не освободилась: строим страницу сами
+    return None, None
+
+
+def _store(cache_key, response, version, timeout):
+    if response.status_code != 200 or response.streaming:
+        return
+    # Сжимается один раз на заполнение кэша, а не на каждый показ
+    compression.precompress(response)
+    fresh = timeout * random.uniform(1 - JITTER, 1)
+    cache.set(
+        cache_key, (version, time.time() + fresh, response),
+        timeout + STALE_TTL,
+    )
+
+
+def cache_page_tagged(tags, timeout=None, per_user=False):
+    """Кэширует ответ view, как cache_page, но с тегами зависимостей.
+
+    tags(request, *args, **kwargs) возвращает теги страницы, например
+    ['group:3'], или None, если объекта нет: тогда кэш не
+    используется. Запись хранит версии тегов, с которыми её
+    построили: bump_tags() по любому из них делает её устаревшей, и TTL
+    можно держать большим.
+
+    Устаревшую страницу перестраивает ровно один запрос — тот, кто взял
+    блокировку в кэше; остальные тем временем получают старую копию
+    (stale-while-revalidate). Срок свежести слегка случайный, чтобы
+    страницы, закэшированные одновременно, не устаревали разом.
+    Посетитель, только что сделавший запись (см. read_your_writes),
+    старую копию не получает: страницу для него строят сразу.
+
+    per_user=True — своя копия у каждого пользователя, для страниц вроде
+    ленты подписок, которые {% hole %} не разделить на общую часть и
+    личные фрагменты. Копии неактивных пользователей кэш вытесняет
+    первыми: SQLiteCache удаляет давно не читанные записи.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_TTL
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_tags = _page_tags(tags, request, *args, **kwargs)
+            if page_tags is None:
+                return view(request, *args, **kwargs)
+            version = tags_version(page_tags)
+            cache_key = page_key(request)
+            if per_user:
+                cache_key += f'.user{request.user.pk}'
+            response, lock_key = _lookup(
+                cache_key, version,
+                allow_stale=DIRTY_COOKIE not in request.COOKIES,
+            )
+            if response is not None:
+                return response
+            try:
+                response = view(request, *args, **kwargs)
+                _store(cache_key, response, version, timeout)
+            finally:
+                if lock_key is not None:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
+
+
+def read_your_writes(view):
+    """Отмечает посетителя после успешной записи (POST с редиректом).
+
+    Пока жива cookie DIRTY_COOKIE, cache_page_tagged не отдаёт ему
+    устаревших копий, и он сразу видит свой пост или комментарий;
+    остальные по-прежнему получают копию из кэша. Cookie, а не сессия:
+    проверка не стоит запроса к БД.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method == 'POST' and response.status_code in (302, 303):
+            response.set_cookie(
+                DIRTY_COOKIE, '1', max_age=DIRTY_TTL, httponly=True,
+                samesite='Lax',
+            )
+        return response
+    return wrapper
+
+
+def etag_tagged(tags, viewer_tags=None):
+    """Условный GET по версиям тегов страницы: 304 без вызова view.
+
+    ETag складывается из версий тегов, адреса с параметрами и cookie
+    сессии и CSRF: страница с шапкой пользователя и формами у каждого
+    посетителя своя. Если tags() вернул None (объекта нет), проверка
+    пропускается.
+
+    viewer_tags(request) — теги того, что страница выводит посетителю
+    через {% hole %}, например ['follows:7'] для кнопок подписки. В ключ
+    общей копии в кэше они не входят, только в ETag.
+
+    Устаревшая копия из cache_page_tagged уходит без ETag: текущие
+    версии тегов к ней не относятся, и браузер, сохранив их, получал
+    бы 304 на старую страницу до следующего изменения данных.
+    """
+    def etag(request, *args, **kwargs):
+        page_tags = _page_tags(tags, request, *args, **kwargs)
+        if page_tags is None:
+            return None
+        if viewer_tags is not None:
+            page_tags = [*page_tags, *viewer_tags(request)]
+        fingerprint = '|'.join((
+            tags_version(page_tags),
+            request.get_full_path(),
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ))
+        return hashlib.md5(fingerprint.encode()).hexdigest()
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_etag = etag(request, *args, **kwargs)
+            if page_etag is None:
+                return view(request, *args, **kwargs)
+            page_etag = quote_etag(page_etag)
+            response = get_conditional_response(request, etag=page_etag)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not getattr(
+                response, 'stale', False
+            ):
+                response['ETag'] = page_etag
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,147 @@
+"""Сжатие ответов: gzip и, если установлен пакет brotli, br.
+
+Страница из cache_page_tagged сжимается один раз, когда попадает в кэш
+(precompress): куски между метками {% hole %} хранятся готовыми
+deflate-блоками, а на каждый запрос сжимаются только заполненные
+фрагменты — обычно несколько сотен байт. Каждый кусок сжат отдельным
+компрессором без общей истории и дописан до границы байта
+(Z_SYNC_FLUSH), поэтому их склейка — корректный поток deflate, который
+остаётся обернуть в заголовок gzip и CRC32 всего тела.
+
+Brotli так не склеить: br готовится только для ответов без меток,
+например JSON API. Остальные ответы сжимаются gzip на лету, как в
+django.middleware.gzip.GZipMiddleware.
+"""
+import re
+import struct
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+from . import holes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Короче не сжимаем: заголовки съедят выигрыш
+MIN_LENGTH = 200
+LEVEL = 6
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript')
+# Без имени файла и времени: одинаковые тела сжимаются одинаково
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def _compressor():
+    return zlib.compressobj(LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+
+# Пустой последний блок, закрывающий склеенный поток
+FINAL_BLOCK = _compressor().flush()
+
+
+def deflate(data):
+    """Кусок deflate, который можно склеивать с другими такими же."""
+    compressor = _compressor()
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def gzip(segments, content):
+    """gzip-поток из кусков deflate() с несжатым телом content."""
+    return b''.join([
+        GZIP_HEADER,
+        *segments,
+        FINAL_BLOCK,
+        struct.pack('<II', zlib.crc32(content), len(content) & 0xffffffff),
+    ])
+
+
+def _compressible(response):
+    return (
+        not response.streaming
+        and not response.has_header('Content-Encoding')
+        and response.get('Content-Type', '').startswith(COMPRESSIBLE)
+        and len(response.content) >= MIN_LENGTH
+    )
+
+
+def precompress(response):
+    """Сжимает ответ, который кладут в кэш, по кускам между метками."""
+    if not _compressible(response):
+        return
+    parts, _ = holes.split(response.content.decode(response.charset))
+    parts = [part.encode(response.charset) for part in parts]
+    response.deflated = [(len(part), deflate(part)) for part in parts]
+    if brotli is not None and len(parts) == 1:
+        response.brotli = (len(response.content),
+                           brotli.compress(response.content))
+
+
+def _stitched(response):
+    """Куски gzip-потока из готовых блоков и свежесжатых фрагментов.
+
+    None, если ответ не из кэша или тело поменяли после precompress().
+    """
+    deflated = getattr(response, 'deflated', None)
+    if deflated is None:
+        return None
+    fragments = [
+        fragment.encode(response.charset)
+        for fragment in getattr(response, 'hole_fragments', ())
+    ]
+    if len(fragments) != len(deflated) - 1:
+        return None
+    size = sum(length for length, _ in deflated) + sum(map(len, fragments))
+    if size != len(response.content):
+        return None
+    segments = [deflated[0][1]]
+    for fragment, (_, part) in zip(fragments, deflated[1:]):
+        segments += [deflate(fragment), part]
+    return segments
+
+
+def _accepts(request, encoding):
+    return re.search(
+        rf'\b{encoding}\b', request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+
+
+def compress(request, response):
+    """(тело, кодировка) для Accept-Encoding запроса или None."""
+    content = response.content
+    ready = getattr(response, 'brotli', None)
+    if ready is not None and ready[0] == len(content) and _accepts(
+        request, 'br'
+    ):
+        return ready[1], 'br'
+    if _accepts(request, 'gzip'):
+        segments = _stitched(response) or [deflate(content)]
+        return gzip(segments, content), 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    """Сжимает ответы; страницы из кэша — без повторного сжатия.
+
+    Стоит в MIDDLEWARE сразу после ProfilingMiddleware: получает тело,
+    уже заполненное HoleMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not _compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = compress(request, response)
+        if compressed is None or len(compressed[0]) >= len(response.content):
+            return response
+        response.content, response['Content-Encoding'] = compressed
+        response['Content-Length'] = str(len(response.content))
+        # Сжатое тело побайтно другое: сильный ETag становится слабым
+        etag = response.get('ETag', '')
+        if etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,125 @@
+"""Персональные фрагменты в общем для всех кэше страниц.
+
+Шаблон вместо фрагмента, зависящего от посетителя, выводит метку:
+
+    {% load holes %}
+    {% hole 'follow_button' author.username %}
+
+Страница с метками кэшируется одна на всех, а HoleMiddleware перед
+отправкой заменяет метки на HTML, построенный для текущего запроса.
+Заполняет метку функция, зарегистрированная под её именем:
+
+    @holes.register('follow_button')
+    def follow_button(request, calls):
+        ...
+
+calls — список кортежей аргументов всех меток с этим именем на странице,
+функция возвращает список HTML той же длины. Так десять кнопок
+подписки на странице обходятся одним запросом к БД, а не десятью.
+"""
+import json
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import salted_hmac
+
+_renderers = {}
+
+
+def register(name):
+    def decorator(renderer):
+        _renderers[name] = renderer
+        return renderer
+    return decorator
+
+
+def _token():
+    # Метку с подписью от SECRET_KEY не подделать текстом поста
+    return salted_hmac('core.holes', 'hole').hexdigest()[:16]
+
+
+def marker(name, *args):
+    return '<!--hole:{}:{}:{}-->'.format(
+        _token(), name, quote(json.dumps(args))
+    )
+
+
+def _pattern():
+    return re.compile(r'<!--hole:{}:(\w+):([^>]*?)-->'.format(_token()))
+
+
+def split(content):
+    """(куски между метками, метки [(имя, аргументы)]).
+
+    Кусков всегда на один больше, чем меток.
+    """
+    pieces = _pattern().split(content)
+    return pieces[0::3], list(zip(pieces[1::3], pieces[2::3]))
+
+
+def render(request, markers):
+    """HTML фрагментов для меток из split(), в том же порядке."""
+    calls = {}
+    for name, args in markers:
+        calls.setdefault(name, {}).setdefault(
+            args, tuple(json.loads(unquote(args)))
+        )
+    html = {}
+    for name, by_args in calls.items():
+        rendered = _renderers[name](request, list(by_args.values()))
+        html.update(
+            ((name, args), fragment)
+            for args, fragment in zip(by_args, rendered)
+        )
+    return [html[marker] for marker in markers]
+
+
+def join(parts, fragments):
+    pieces = [parts[0]]
+    for fragment, part in zip(fragments, parts[1:]):
+        pieces += [fragment, part]
+    return ''.join(pieces)
+
+
+def fill(request, content):
+    """content с метками, заменёнными на фрагменты для request."""
+    parts, markers = split(content)
+    if not markers:
+        return content
+    return join(parts, render(request, markers))
+
+
+class HoleMiddleware:
+    """Заполняет метки {% hole %} в HTML-ответах.
+
+    Стоит последним в MIDDLEWARE: к этому моменту известны пользователь
+    и сессия, а CSRF-cookie для форм из фрагментов ещё успеет
+    выставить CsrfViewMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or not response.get('Content-Type', '').startswith('text/html')
+        ):
+            return response
+        parts, markers = split(response.content.decode(response.charset))
+        if not markers:
+            return response
+        fragments = render(request, markers)
+        response.content = join(parts, fragments).encode(response.charset)
+        # По ним CompressionMiddleware досжимает страницу из кэша
+        response.hole_fragments = fragments
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+@register('header')
+def header(request, calls):
+    html = render_to_string('includes/header.html', request=request)
+    return [html] * len(calls)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Старые ссылки вида ?page=N без курсора обслуживаем через OFFSET
+# только на первых страницах, глубже они ведут на первую.
+OFFSET_PAGES = 5
+
+
+def encode_cursor(obj, keys):
+    """Курсор записи: '<микросекунды даты>_<id>'.
+
+    obj — модель или словарь из values().
+    """
+    date_key, id_key = keys
+    if isinstance(obj, dict):
+        date, pk = obj[date_key], obj[id_key]
+    else:
+        date, pk = getattr(obj, date_key), getattr(obj, id_key)
+    delta = date - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6
+    return f'{micros + delta.microseconds}_{pk}'
+
+
+def decode_cursor(cursor):
+    """Возвращает (дата, id) или None для пустого и битого курсора."""
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Следующая страница выбирается условием «ключ меньше ключа последней
+    записи», поэтому её стоимость не зависит от глубины. Число страниц
+    заранее неизвестно: num_pages показывает текущую страницу и, если
+    дальше есть записи, ещё одну.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 offset_pages=OFFSET_PAGES, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.keys = keys
+        self.offset_pages = offset_pages
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def _ordered(self, descending=True):
+        sign = '-' if descending else ''
+        return self.object_list.order_by(*(sign + key for key in self.keys))
+
+    def _beyond(self, cursor, lookup):
+        # (date < d) OR (date = d AND id < pk), записанное так, чтобы
+        # первое условие было диапазоном по индексу: SQLite делает seek
+        # вместо просмотра индекса с начала.
+        date_key, id_key = self.keys
+        date, pk = cursor
+        return Q(**{f'{date_key}__{lookup}e': date}) & (
+            Q(**{f'{date_key}__{lookup}': date})
+            | Q(**{f'{id_key}__{lookup}': pk})
+        )
+
+    def _fetch(self, queryset):
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def page(self, number):
+        return self.get_page(number)
+
+    def get_page(self, number, after=None, before=None):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        after, before = decode_cursor(after), decode_cursor(before)
+        if after:
+            rows, has_next = self._fetch(
+                self._ordered().filter(self._beyond(after, 'lt'))
+            )
+        elif before:
+            rows, has_previous = self._fetch(
+                self._ordered(descending=False).filter(
+                    self._beyond(before, 'gt')
+                )
+            )
+            if not rows:
+                # Более новых записей нет, например их удалили
+                return self.get_page(1)
+            rows.reverse()
+            has_next = True
+            if not has_previous:
+                number = 1
+        else:
+            if number > self.offset_pages:
+                number = 1
+            bottom = (number - 1) * self.per_page
+            rows, has_next = self._fetch(self._ordered()[bottom:])
+        if not rows and number > 1:
+            return self.get_page(1)
+        self._num_pages = number + 1 if has_next else number
+        return self._make_page(rows, number, has_next)
+
+    def _make_page(self, rows, number, has_next):
+        page = self._get_page(rows, number, self)
+        page.next_query = page.previous_query = ''
+        if has_next and rows:
+            page.next_query = urlencode({
+                'page': number + 1,
+                'after': encode_cursor(rows[-1], self.keys),
+            })
+        if number == 2:
+            page.previous_query = urlencode({'page': 1})
+        elif number > 2:
+            page.previous_query = urlencode({
+                'page': number - 1,
+                'before': encode_cursor(rows[0], self.keys),
+            })
+        return page
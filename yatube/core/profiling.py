@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+
+_local = threading.local()
+_lock = threading.Lock()
+# Последние PROFILING_SAMPLES замеров на каждое имя URL
+_samples = defaultdict(lambda: deque(maxlen=settings.PROFILING_SAMPLES))
+METRICS = ('total', 'sql', 'queries', 'template', 'cache_hits',
+           'cache_misses')
+
+
+class _Timings:
+    def __init__(self):
+        self.sql = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def _current():
+    return getattr(_local, 'timings', None)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timings = _current()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.sql += time.perf_counter() - start
+            timings.queries += 1
+
+
+def _instrument_cache(backend):
+    """Считает попадания в кэш у объекта бэкенда текущего потока."""
+    if getattr(backend, '_profiled', False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    def profiled_get(key, default=None, version=None):
+        value = get(key, default, version)
+        timings = _current()
+        if timings is not None:
+            if value is default:
+                timings.cache_misses += 1
+            else:
+                timings.cache_hits += 1
+        return value
+
+    def profiled_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version)
+        timings = _current()
+        if timings is not None:
+            timings.cache_hits += len(values)
+            timings.cache_misses += len(keys) - len(values)
+        return values
+
+    backend.get, backend.get_many = profiled_get, profiled_get_many
+    backend._profiled = True
+
+
+class _ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current()
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            if timings is not None:
+                timings.template += time.perf_counter() - start
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """DjangoTemplates, который замеряет время render() для
+    ProfilingMiddleware. Вложенные include входят во время шаблона,
+    который их подключил."""
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return _ProfiledTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return _ProfiledTemplate(template.template, self)
+
+
+def record(name, sample):
+    with _lock:
+        _samples[name].append(sample)
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу, values отсортированы."""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def stats():
+    """[(имя URL, число замеров, {метрика: (p50, p95, p99)})]"""
+    with _lock:
+        samples = {name: list(rows) for name, rows in _samples.items()}
+    result = []
+    for name in sorted(samples):
+        rows = samples[name]
+        metrics = {}
+        for index, metric in enumerate(METRICS):
+            values = sorted(row[index] for row in rows)
+            metrics[metric] = tuple(
+                percentile(values, fraction) for fraction in (.5, .95, .99)
+            )
+        result.append((name, len(rows), metrics))
+    return result
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+class ProfilingMiddleware:
+    """Замеряет SQL, шаблоны и кэш каждого запроса.
+
+    Итог уходит в гистограмму по имени URL, которую показывает страница
+    request_stats, а персоналу и при DEBUG — ещё и в заголовок
+    Server-Timing.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _instrument_cache(caches['default'])
+        timings = _local.timings = _Timings()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(_sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        record(match.view_name if match else '<unresolved>', (
+            total * 1000,
+            timings.sql * 1000,
+            timings.queries,
+            timings.template * 1000,
+            timings.cache_hits,
+            timings.cache_misses,
+        ))
+        # Время SQL и число запросов — не для посторонних, как и /stats/
+        user = getattr(request, 'user', None)
+        if not settings.DEBUG and not (user and user.is_staff):
+            return response
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={timings.sql * 1000:.1f};'
+            f'desc="{timings.queries} queries"',
+            f'tpl;dur={timings.template * 1000:.1f}',
+            f'cache;desc="{timings.cache_hits} hits, '
+            f'{timings.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        return response
@@ -0,0 +1,30 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudget(CaptureQueriesContext):
+    """Падает, если внутри блока выполнено больше limit SQL-запросов.
+
+    В сообщении перечислены все запросы, так что N+1 видно сразу:
+
+        with QueryBudget(4, 'posts:index'):
+            client.get('/')
+    """
+
+    def __init__(self, limit, label='', connection=connection):
+        super().__init__(connection)
+        self.limit = limit
+        self.label = label
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None or len(self) <= self.limit:
+            return
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(self.captured_queries, start=1)
+        )
+        raise AssertionError(
+            f'{self.label}: {len(self)} SQL-запросов '
+            f'при бюджете {self.limit}:\n{queries}'
+        )
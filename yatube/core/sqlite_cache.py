@@ -0,0 +1,321 @@
+"""Кэш в файле SQLite, общий для всех процессов на машине.
+
+В отличие от LocMemCache, запись и сброс тегов из одного gunicorn-воркера
+сразу видят остальные. Подключение:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_BYTES': 64 * 1024 * 1024},
+        }
+    }
+
+Записи вытесняются по давности последнего чтения (LRU), когда их суммарный
+размер превышает MAX_BYTES или число — MAX_ENTRIES.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Время последнего чтения обновляется не чаще, чем раз в TOUCH_INTERVAL
+# секунд: иначе каждое чтение было бы записью в файл.
+TOUCH_INTERVAL = 10
+# При переполнении освобождаем место с запасом, чтобы не вытеснять
+# по одной записи на каждый set()
+EVICT_TO = 0.9
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    )""",
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    # Объём и число записей ведут триггеры: SUM(size) по всей таблице
+    # на каждый set() был бы слишком дорог
+    """CREATE TABLE IF NOT EXISTS cache_usage (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        bytes INTEGER NOT NULL,
+        entries INTEGER NOT NULL
+    )""",
+    'INSERT OR IGNORE INTO cache_usage VALUES (0, 0, 0)',
+    """CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+        UPDATE cache_usage
+        SET bytes = bytes + new.size, entries = entries + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+        UPDATE cache_usage
+        SET bytes = bytes - old.size, entries = entries - 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_update
+        AFTER UPDATE OF size ON cache BEGIN
+        UPDATE cache_usage SET bytes = bytes - old.size + new.size;
+    END""",
+]
+UPSERT = """
+    INSERT INTO cache (key, value, expires, accessed, size)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = excluded.value,
+        expires = excluded.expires,
+        accessed = excluded.accessed,
+        size = excluded.size
+"""
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    def _connection(self):
+        """Своё соединение у каждого потока; после fork — новое."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            with self._transaction(connection):
+                for sql in SCHEMA:
+                    connection.execute(sql)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _transaction(connection):
+        """BEGIN IMMEDIATE: блокировка записи сразу, без гонки между
+        чтением и записью в incr() и add()."""
+        class Transaction:
+            def __enter__(self):
+                connection.execute('BEGIN IMMEDIATE')
+                return connection
+
+            def __exit__(self, exc_type, exc, traceback):
+                connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return Transaction()
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _expired(expires, now):
+        return expires is not None and expires <= now
+
+    def _store(self, connection, key, value, timeout):
+        expires = self.get_backend_timeout(timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            UPSERT, (key, data, expires, time.time(), len(data))
+        )
+
+    def _evict(self, connection):
+        bytes_used, entries = connection.execute(
+            'SELECT bytes, entries FROM cache_usage'
+        ).fetchone()
+        if bytes_used <= self._max_bytes and entries <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        bytes_used, entries = connection.execute(
+            'SELECT bytes, entries FROM cache_usage'
+        ).fetchone()
+        excess_bytes = bytes_used - self._max_bytes * EVICT_TO
+        excess_entries = 0
+        if entries > self._max_entries:
+            # CULL_FREQUENCY = 0, как в Django, — очистить кэш целиком;
+            # остаётся только что записанное
+            excess_entries = (
+                max(1, entries // self._cull_frequency)
+                if self._cull_frequency else entries - 1
+            )
+        victims = []
+        freed = 0
+        rows = connection.execute(
+            'SELECT key, size FROM cache ORDER BY accessed, rowid'
+        )
+        for key, size in rows:
+            if freed >= excess_bytes and len(victims) >= excess_entries:
+                break
+            victims.append(key)
+            freed += size
+        rows.close()
+        for start in range(0, len(victims), 500):
+            chunk = victims[start:start + 500]
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                chunk,
+            )
+
+    def _get_rows(self, keys):
+        """{key: значение} для живых записей; заодно отмечает чтение."""
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        touched = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN ({})'.format(', '.join('?' * len(chunk))),
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if self._expired(expires, now):
+                    continue
+                found[key] = pickle.loads(value)
+                if now - accessed > TOUCH_INTERVAL:
+                    touched.append(key)
+        if touched:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in touched],
+            )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._get_rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._get_rows(list(keys))
+        return {keys[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None and not self._expired(row[0], time.time())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            self._store(connection, key, value, timeout)
+            self._evict(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        with self._transaction(connection):
+            for key, value in data.items():
+                self._store(
+                    connection, self._key(key, version), value, timeout
+                )
+            self._evict(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and not self._expired(row[0], time.time()):
+                return False
+            self._store(connection, key, value, timeout)
+            self._evict(connection)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно между процессами: чтение и запись под одной
+        блокировкой файла."""
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+        return value
+
+    def incr_many(self, keys, delta=1, version=None):
+        """incr() для нескольких ключей в одной транзакции.
+
+        Возвращает {ключ: новое значение}; отсутствующих ключей в нём
+        нет, ValueError не бросается.
+        """
+        keys = {self._key(key, version): key for key in keys}
+        cache_keys = list(keys)
+        connection = self._connection()
+        now = time.time()
+        values = {}
+        with self._transaction(connection):
+            for start in range(0, len(cache_keys), 500):
+                chunk = cache_keys[start:start + 500]
+                rows = connection.execute(
+                    'SELECT key, value, expires FROM cache '
+                    'WHERE key IN ({})'.format(', '.join('?' * len(chunk))),
+                    chunk,
+                ).fetchall()
+                for key, value, expires in rows:
+                    if self._expired(expires, now):
+                        continue
+                    values[key] = pickle.loads(value) + delta
+            rows = []
+            for key, value in values.items():
+                data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                rows.append((data, len(data), key))
+            connection.executemany(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?', rows
+            )
+        return {keys[key]: value for key, value in values.items()}
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        connection = self._connection()
+        with self._transaction(connection):
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт, пока жив поток: открывать файл на каждый
+        # запрос дороже, чем держать его открытым
+        pass
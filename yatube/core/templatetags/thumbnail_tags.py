@@ -0,0 +1,18 @@
+from django import template
+
+from core import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry, tags=()):
+    """Готовая миниатюра или None, если её ещё создают.
+
+    {% ready_thumbnail post.image '960x339' post.cache_tags as im %}
+
+    Страницы с тегами tags сбросятся, когда миниатюра будет готова.
+    """
+    return thumbnails.lookup(
+        image.name if image else None, geometry, tags
+    )
@@ -0,0 +1,37 @@
+"""Тесты с собственным файлом кэша.
+
+Иначе cache.clear() в тестах стирал бы кэш сайта из этой же копии
+(BASE_DIR/cache.sqlite3), а параллельные запуски мешали бы друг другу.
+Подключены и к manage.py test (TEST_RUNNER), и к pytest (conftest.py).
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def temp_cache():
+    """(override_settings с кэшем во временном каталоге, каталог)."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    default = dict(
+        settings.CACHES['default'],
+        LOCATION=os.path.join(directory, 'cache.sqlite3'),
+    )
+    return override_settings(
+        CACHES={**settings.CACHES, 'default': default}
+    ), directory
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_settings, self._cache_directory = temp_cache()
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,5 +1,33 @@
+import datetime
+import gzip
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from decimal import Decimal
 from http import HTTPStatus
-from django.test import TestCase
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.http import HttpResponse, HttpResponseRedirect
+from django.db import transaction
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+)
+
+from posts.models import Post
+
+from . import compression, holes, profiling
+from . import cache as tagged_cache
+from .cache import (
+    bump_tags, bump_tags_on_commit, cache_page_tagged, etag_tagged,
+    tags_version,
+)
+from .sqlite_cache import SQLiteCache
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +35,871 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheTagsTest(TestCase):
+    def test_bump_changes_only_its_tag(self):
+        """bump_tags меняет версию только своего тега."""
+        group_version = tags_version(['group:1'])
+        post_version = tags_version(['post:1'])
+        bump_tags('group:1')
+        self.assertNotEqual(tags_version(['group:1']), group_version)
+        self.assertEqual(tags_version(['post:1']), post_version)
+
+    def test_bump_many_tags_at_once(self):
+        """Известные теги сбрасываются одним incr_many, новые —
+        одним set_many."""
+        versions = [tags_version([f'feed:{i}']) for i in range(3)]
+        with mock.patch.object(cache, 'incr') as incr:
+            bump_tags('feed:0', 'feed:1', 'feed:2', 'feed:new')
+        incr.assert_not_called()
+        for i, version in enumerate(versions):
+            self.assertNotEqual(tags_version([f'feed:{i}']), version)
+        self.assertTrue(tags_version(['feed:new']))
+
+
+class BumpOnCommitTest(TransactionTestCase):
+    def test_bumped_again_after_commit(self):
+        """Страница, построенная до коммита, после него устаревает."""
+        before = tags_version(['commit'])
+        with transaction.atomic():
+            bump_tags_on_commit('commit')
+            inside = tags_version(['commit'])
+            self.assertNotEqual(inside, before)
+        self.assertNotEqual(tags_version(['commit']), inside)
+
+
+class StaleWhileRevalidateTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+
+        @cache_page_tagged(lambda request: ['swr'], timeout=60)
+        def view(request):
+            self.renders += 1
+            return HttpResponse(f'render {self.renders}')
+        self.view = view
+
+    def get(self):
+        return self.view(RequestFactory().get('/swr/')).content.decode()
+
+    def lock_key(self):
+        request = RequestFactory().get('/swr/')
+        return tagged_cache.page_key(request) + '.lock'
+
+    def test_fresh_entry_served_from_cache(self):
+        self.assertEqual(self.get(), 'render 1')
+        self.assertEqual(self.get(), 'render 1')
+
+    def test_stale_entry_served_while_other_request_rebuilds(self):
+        self.get()
+        bump_tags('swr')
+        # Другой запрос уже перестраивает страницу
+        cache.add(self.lock_key(), 1)
+        self.assertEqual(self.get(), 'render 1')
+        self.assertEqual(self.renders, 1)
+        cache.delete(self.lock_key())
+        self.assertEqual(self.get(), 'render 2')
+        self.assertIsNone(cache.get(self.lock_key()))
+
+    def test_writer_skips_stale_entry(self):
+        """После своей записи посетитель не получает старую копию."""
+        self.get()
+        bump_tags('swr')
+        cache.add(self.lock_key(), 1)
+        request = RequestFactory().get('/swr/')
+        request.COOKIES[tagged_cache.DIRTY_COOKIE] = '1'
+        self.assertEqual(self.view(request).content.decode(), 'render 2')
+        # Построенная им страница обновила кэш и для остальных
+        self.assertEqual(self.get(), 'render 2')
+        self.assertEqual(self.renders, 2)
+
+    def test_read_your_writes_marks_successful_post(self):
+        @tagged_cache.read_your_writes
+        def view(request):
+            if request.method == 'POST':
+                return HttpResponseRedirect('/')
+            return HttpResponse()
+
+        factory = RequestFactory()
+        cookie = tagged_cache.DIRTY_COOKIE
+        response = view(factory.post('/'))
+        self.assertEqual(response.cookies[cookie]['max-age'],
+                         tagged_cache.DIRTY_TTL)
+        self.assertNotIn(cookie, view(factory.get('/')).cookies)
+
+    def test_stale_entry_has_no_etag(self):
+        """ETag по новым версиям тегов не достаётся старой копии."""
+        view = etag_tagged(lambda request: ['swr'])(self.view)
+        etag = view(RequestFactory().get('/swr/'))['ETag']
+        bump_tags('swr')
+        cache.add(self.lock_key(), 1)
+        response = view(
+            RequestFactory().get('/swr/', HTTP_IF_NONE_MATCH=etag)
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.content.decode(), 'render 1')
+        self.assertFalse(response.has_header('ETag'))
+        cache.delete(self.lock_key())
+        response = view(RequestFactory().get('/swr/'))
+        self.assertEqual(response.content.decode(), 'render 2')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_page_key_ignores_host_and_scheme(self):
+        factory = RequestFactory()
+        self.assertEqual(
+            tagged_cache.page_key(factory.get('/swr/?page=2')),
+            tagged_cache.page_key(factory.get(
+                '/swr/?page=2', secure=True, HTTP_HOST='localhost'
+            )),
+        )
+        self.assertNotEqual(
+            tagged_cache.page_key(factory.get('/swr/?page=2')),
+            tagged_cache.page_key(factory.get('/swr/?page=3')),
+        )
+
+    def test_ttl_has_jitter(self):
+        with mock.patch('core.cache.random.uniform', return_value=0.9):
+            self.get()
+        request = RequestFactory().get('/swr/')
+        entry = cache.get(tagged_cache.page_key(request))
+        self.assertAlmostEqual(entry[1] - time.time(), 54, delta=1)
+        with mock.patch('core.cache.time.time', return_value=entry[1] + 1):
+            self.assertEqual(self.get(), 'render 2')
+
+
+class HolesTest(SimpleTestCase):
+    def test_only_signed_markers_are_filled(self):
+        holes.register('test_echo')(
+            lambda request, calls: [str(args) for args in calls]
+        )
+        forged = '<!--hole:0000000000000000:test_echo:%5B1%5D-->'
+        content = holes.marker('test_echo', 1) + holes.marker(
+            'test_echo', 2
+        ) + holes.marker('test_echo', 1) + forged
+        self.assertEqual(
+            holes.fill(None, content), '(1,)(2,)(1,)' + forged
+        )
+
+
+class CompressionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create_user(username='reader')
+        author = get_user_model().objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Пост {number}' * 20)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_stitched_segments_are_valid_gzip(self):
+        pieces = [b'<p>', b'', 'фрагмент'.encode() * 50, b'</p>']
+        content = b''.join(pieces)
+        stream = compression.gzip(
+            [compression.deflate(piece) for piece in pieces], content
+        )
+        self.assertEqual(gzip.decompress(stream), content)
+
+    def test_cached_page_compressed_once(self):
+        """Из кэша страница отдаётся без повторного сжатия: сжимаются
+        только заполненные фрагменты."""
+        plain = self.client.get('/').content
+        deflate = mock.Mock(wraps=compression.deflate)
+        with mock.patch.object(compression, 'deflate', deflate):
+            response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertIn(b'reader', plain, 'шапка заполнена для reader')
+        compressed = [len(call.args[0]) for call in deflate.call_args_list]
+        self.assertTrue(compressed)
+        self.assertLess(sum(compressed), len(plain) / 2)
+
+    def test_identity_without_accept_encoding(self):
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_brotli_only_for_pages_without_holes(self):
+        brotli = mock.Mock(compress=lambda data: b'br')
+        with mock.patch.object(compression, 'brotli', brotli):
+            api = self.client.get(
+                '/api/posts/', HTTP_ACCEPT_ENCODING='gzip, br'
+            )
+            self.assertEqual(api['Content-Encoding'], 'br')
+            self.assertEqual(api.content, b'br')
+            self.assertTrue(api['ETag'].startswith('W/'))
+            page = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(page['Content-Encoding'], 'gzip')
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        profiling.reset()
+
+    def test_server_timing_header(self):
+        """Server-Timing видит только персонал."""
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.client.force_login(get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        ))
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+    def test_stats_page(self):
+        """Страница статистики только для персонала и знает про index."""
+        self.client.get('/')
+        self.client.get('/')
+        response = self.client.get('/stats/')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+        staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get('/stats/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        name, count, metrics = next(
+            row for row in response.context['stats']
+            if row[0] == 'posts:index'
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(set(metrics), set(profiling.METRICS))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(profiling.percentile(values, .5), 50)
+        self.assertEqual(profiling.percentile(values, .99), 99)
+        self.assertEqual(profiling.percentile([7], .95), 7)
+
+
+def _increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        cache = self.cache
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('key', 'default'), 'default')
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(cache.has_key('key'))
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete('a')
+        cache.delete_many(['b', 'new'])
+        self.assertEqual(cache.get_many(['a', 'b', 'new']), {})
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+
+    def test_versions_are_separate(self):
+        self.cache.set('key', 1, version=1)
+        self.cache.set('key', 2, version=2)
+        self.assertEqual(self.cache.get('key', version=1), 1)
+        self.assertEqual(self.cache.get('key', version=2), 2)
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.incr('counter', 10), 12)
+        self.assertEqual(self.cache.decr('counter'), 11)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_many(self):
+        """incr_many — одна транзакция, отсутствующие ключи пропускает."""
+        self.cache.set_many({'a': 1, 'b': 5})
+        self.cache.set('expired', 1, 0)
+        with mock.patch.object(
+            self.cache, '_transaction', wraps=self.cache._transaction
+        ) as transaction_:
+            self.assertEqual(
+                self.cache.incr_many(['a', 'b', 'missing', 'expired']),
+                {'a': 2, 'b': 6},
+            )
+        transaction_.assert_called_once()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 2, 'b': 6})
+
+    def test_timeouts(self):
+        self.cache.set('expired', 1, 0)
+        self.assertIsNone(self.cache.get('expired'))
+        self.cache.set('short', 1, 1)
+        self.cache.set('forever', 1, None)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.add('forever', 2))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertTrue(self.cache.touch('forever', 0))
+        self.assertIsNone(self.cache.get('forever'))
+
+    def test_tests_use_own_cache_file(self):
+        """Тесты не трогают кэш сайта в BASE_DIR."""
+        self.assertNotEqual(
+            os.path.dirname(cache._path), str(settings.BASE_DIR)
+        )
+
+    def test_shared_between_instances(self):
+        """Другой процесс открывает тот же файл — и видит те же данные."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_eviction_under_byte_budget(self):
+        cache = self.make_cache(MAX_BYTES=20 * 1024)
+        for index in range(10):
+            cache.set(f'key{index}', 'x' * 1024)
+        with mock.patch('core.sqlite_cache.TOUCH_INTERVAL', -1):
+            cache.get('key0')
+        for index in range(10, 22):
+            cache.set(f'key{index}', 'x' * 1024)
+        self.assertIsNotNone(cache.get('key0'), 'недавно прочитанный ключ')
+        self.assertIsNone(cache.get('key1'), 'самый старый ключ')
+        used = cache._connection().execute(
+            'SELECT bytes FROM cache_usage'
+        ).fetchone()[0]
+        self.assertLessEqual(used, 20 * 1024)
+
+    def test_cull_by_max_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=30)
+        for index in range(50):
+            cache.set(f'key{index}', index)
+        count = sum(cache.has_key(f'key{index}') for index in range(50))
+        self.assertLessEqual(count, 30)
+
+
+def custom_key_func(key, key_prefix, version):
+    return 'CUSTOM-' + '-'.join([key_prefix, str(version), key])
+
+
+class Unpicklable:
+    def __getstate__(self):
+        raise pickle.PickleError()
+
+
+class SQLiteCacheContractTest(SimpleTestCase):
+    """BaseCacheTests из тестов Django 2.2, перенесённые на SQLiteCache.
+
+    Вместо time.sleep() часы сдвигаются через self.sleep().
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.now = time.time()
+        clock = mock.patch('time.time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **params):
+        return SQLiteCache(self.path, params)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def test_simple(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_default_used_when_none_is_set(self):
+        """Закэшированный None возвращается вместо default."""
+        self.cache.set('key_default_none', None)
+        self.assertIsNone(
+            self.cache.get('key_default_none', default='default')
+        )
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('addkey1', 'value'))
+        self.assertFalse(self.cache.add('addkey1', 'newvalue'))
+        self.assertEqual(self.cache.get('addkey1'), 'value')
+
+    def test_prefix(self):
+        prefixed = self.make_cache(KEY_PREFIX='cacheprefix')
+        self.cache.set('somekey', 'value')
+        self.assertFalse(prefixed.has_key('somekey'))
+        prefixed.set('somekey', 'value2')
+        self.assertEqual(self.cache.get('somekey'), 'value')
+        self.assertEqual(prefixed.get('somekey'), 'value2')
+
+    def test_non_existent(self):
+        self.assertIsNone(self.cache.get('does_not_exist'))
+        self.assertEqual(self.cache.get('does_not_exist', 'bang!'), 'bang!')
+
+    def test_get_many(self):
+        cache = self.cache
+        cache.set_many({'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'})
+        self.assertEqual(
+            cache.get_many(['a', 'c', 'd']), {'a': 'a', 'c': 'c', 'd': 'd'}
+        )
+        self.assertEqual(cache.get_many(['a', 'b', 'e']), {'a': 'a', 'b': 'b'})
+        self.assertEqual(cache.get_many(iter(['a'])), {'a': 'a'})
+        self.assertEqual(cache.get_many([]), {})
+
+    def test_delete(self):
+        self.cache.set_many({'key1': 'spam', 'key2': 'eggs'})
+        self.cache.delete('key1')
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertEqual(self.cache.get('key2'), 'eggs')
+        self.cache.delete('does_not_exist')
+
+    def test_has_key(self):
+        cache = self.cache
+        cache.set('hello1', 'goodbye1')
+        self.assertTrue(cache.has_key('hello1'))
+        self.assertFalse(cache.has_key('goodbye1'))
+        cache.set('no_expiry', 'here', None)
+        self.assertTrue(cache.has_key('no_expiry'))
+
+    def test_in(self):
+        self.cache.set('hello2', 'goodbye2')
+        self.assertIn('hello2', self.cache)
+        self.assertNotIn('goodbye2', self.cache)
+
+    def test_incr(self):
+        cache = self.cache
+        cache.set('answer', 41)
+        self.assertEqual(cache.incr('answer'), 42)
+        self.assertEqual(cache.get('answer'), 42)
+        self.assertEqual(cache.incr('answer', 10), 52)
+        self.assertEqual(cache.incr('answer', -10), 42)
+        with self.assertRaises(ValueError):
+            cache.incr('does_not_exist')
+
+    def test_decr(self):
+        cache = self.cache
+        cache.set('answer', 43)
+        self.assertEqual(cache.decr('answer'), 42)
+        self.assertEqual(cache.get('answer'), 42)
+        self.assertEqual(cache.decr('answer', 10), 32)
+        self.assertEqual(cache.decr('answer', -10), 42)
+        with self.assertRaises(ValueError):
+            cache.decr('does_not_exist')
+
+    def test_incr_keeps_timeout(self):
+        self.cache.set('answer', 41, 10)
+        self.cache.incr('answer')
+        self.sleep(11)
+        self.assertIsNone(self.cache.get('answer'))
+
+    def test_close(self):
+        self.cache.set('key', 'value')
+        self.cache.close()
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_data_types(self):
+        stuff = {
+            'string': 'this is a string',
+            'int': 42,
+            'list': [1, 2, 3, 4],
+            'tuple': (1, 2, 3, 4),
+            'dict': {'A': 1, 'B': 2},
+            'function': custom_key_func,
+            'class': Unpicklable,
+            'date': datetime.date(2020, 1, 1),
+            'decimal': Decimal('1.10'),
+        }
+        self.cache.set('stuff', stuff)
+        self.assertEqual(self.cache.get('stuff'), stuff)
+
+    def test_model_instance(self):
+        user = get_user_model()(pk=1, username='reader')
+        self.cache.set('user', user)
+        cached = self.cache.get('user')
+        self.assertEqual(cached, user)
+        self.assertEqual(cached.username, 'reader')
+
+    def test_expiration(self):
+        cache = self.cache
+        cache.set('expire1', 'very quickly', 1)
+        cache.set('expire2', 'very quickly', 1)
+        cache.set('expire3', 'very quickly', 1)
+        self.sleep(2)
+        self.assertIsNone(cache.get('expire1'))
+        self.assertTrue(cache.add('expire2', 'newvalue'))
+        self.assertEqual(cache.get('expire2'), 'newvalue')
+        self.assertFalse(cache.has_key('expire3'))
+        with self.assertRaises(ValueError):
+            cache.incr('expire3')
+
+    def test_touch(self):
+        cache = self.cache
+        cache.set('expire1', 'very quickly', timeout=1)
+        self.assertTrue(cache.touch('expire1', timeout=4))
+        self.sleep(2)
+        self.assertTrue(cache.has_key('expire1'))
+        self.sleep(3)
+        self.assertFalse(cache.has_key('expire1'))
+        cache.set('expire2', 'very quickly', timeout=1)
+        self.assertTrue(cache.touch('expire2', timeout=None))
+        self.sleep(2)
+        self.assertTrue(cache.has_key('expire2'))
+        self.assertFalse(cache.touch('nonexistent'))
+        self.assertFalse(cache.touch('expire1'))
+
+    def test_unicode(self):
+        stuff = {
+            'ascii': 'ascii_value',
+            'unicode_ascii': 'Iñtërnâtiônàlizætiøn1',
+            'Iñtërnâtiônàlizætiøn': 'Iñtërnâtiônàlizætiøn2',
+            'ascii2': {'x': 1},
+        }
+        cache = self.cache
+        for key, value in stuff.items():
+            with self.subTest(key=key):
+                cache.set(key, value)
+                self.assertEqual(cache.get(key), value)
+                cache.delete(key)
+                self.assertTrue(cache.add(key, value))
+                self.assertEqual(cache.get(key), value)
+                cache.delete(key)
+        cache.set_many(stuff)
+        self.assertEqual(cache.get_many(list(stuff)), stuff)
+
+    def test_binary_string(self):
+        value = zlib.compress(b'value to be compressed')
+        cache = self.cache
+        cache.set('binary1', value)
+        self.assertEqual(zlib.decompress(cache.get('binary1')),
+                         b'value to be compressed')
+        cache.add('binary1-add', value)
+        self.assertEqual(cache.get('binary1-add'), value)
+        cache.set_many({'binary1-set_many': value})
+        self.assertEqual(cache.get('binary1-set_many'), value)
+
+    def test_set_many(self):
+        self.assertEqual(
+            self.cache.set_many({'key1': 'spam', 'key2': 'eggs'}), []
+        )
+        self.assertEqual(self.cache.get('key1'), 'spam')
+        self.assertEqual(self.cache.get('key2'), 'eggs')
+        self.assertEqual(self.cache.set_many({}), [])
+
+    def test_set_many_expiration(self):
+        self.cache.set_many({'key1': 'spam', 'key2': 'eggs'}, 1)
+        self.sleep(2)
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertIsNone(self.cache.get('key2'))
+
+    def test_delete_many(self):
+        cache = self.cache
+        cache.set_many({'key1': 'spam', 'key2': 'eggs', 'key3': 'ham'})
+        cache.delete_many(['key1', 'key2', 'key1', 'does_not_exist'])
+        self.assertIsNone(cache.get('key1'))
+        self.assertIsNone(cache.get('key2'))
+        self.assertEqual(cache.get('key3'), 'ham')
+        cache.delete_many([])
+        cache.delete_many(iter(['key3']))
+        self.assertIsNone(cache.get('key3'))
+
+    def test_clear(self):
+        self.cache.set_many({'key1': 'spam', 'key2': 'eggs'})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertIsNone(self.cache.get('key2'))
+        usage = self.cache._connection().execute(
+            'SELECT bytes, entries FROM cache_usage'
+        ).fetchone()
+        self.assertEqual(usage, (0, 0))
+
+    def test_long_timeout(self):
+        """Таймаут больше 30 дней — это секунды, а не метка времени."""
+        cache = self.cache
+        timeout = 60 * 60 * 24 * 30 + 1
+        cache.set('key1', 'eggs', timeout)
+        self.assertEqual(cache.get('key1'), 'eggs')
+        cache.add('key2', 'ham', timeout)
+        self.assertEqual(cache.get('key2'), 'ham')
+        cache.set_many({'key3': 'sausage', 'key4': 'lobster bisque'}, timeout)
+        self.assertEqual(cache.get('key3'), 'sausage')
+
+    def test_forever_timeout(self):
+        cache = self.cache
+        cache.set('key1', 'eggs', None)
+        cache.add('key2', 'ham', None)
+        cache.set_many({'key3': 'sausage'}, None)
+        self.sleep(60 * 60 * 24 * 365)
+        self.assertEqual(
+            cache.get_many(['key1', 'key2', 'key3']),
+            {'key1': 'eggs', 'key2': 'ham', 'key3': 'sausage'},
+        )
+        self.assertFalse(cache.add('key1', 'newvalue', None))
+
+    def test_zero_timeout(self):
+        cache = self.cache
+        cache.set('key1', 'eggs', 0)
+        self.assertIsNone(cache.get('key1'))
+        cache.add('key2', 'ham', 0)
+        self.assertIsNone(cache.get('key2'))
+        cache.set_many({'key3': 'sausage', 'key4': 'lobster bisque'}, 0)
+        self.assertIsNone(cache.get('key3'))
+        self.assertIsNone(cache.get('key4'))
+
+    def test_float_timeout(self):
+        self.cache.set('key1', 'spam', 100.2)
+        self.assertEqual(self.cache.get('key1'), 'spam')
+
+    def perform_cull_test(self, cache, initial_count, final_count):
+        for index in range(1, initial_count):
+            cache.set(f'cull{index}', 'value', 1000)
+        count = sum(
+            cache.has_key(f'cull{index}')
+            for index in range(1, initial_count)
+        )
+        self.assertEqual(count, final_count)
+
+    def test_cull(self):
+        self.perform_cull_test(
+            self.make_cache(OPTIONS={'MAX_ENTRIES': 30}), 50, 29
+        )
+
+    def test_zero_cull(self):
+        self.perform_cull_test(
+            self.make_cache(
+                OPTIONS={'MAX_ENTRIES': 30, 'CULL_FREQUENCY': 0}
+            ),
+            50, 19,
+        )
+
+    def perform_invalid_key_test(self, key, expected_warning):
+        cache = self.make_cache(KEY_FUNCTION=lambda key, *args: key)
+        operations = (
+            lambda: cache.set(key, 'value'),
+            lambda: cache.add(key, 'value'),
+            lambda: cache.get(key),
+            lambda: cache.get_many([key]),
+            lambda: cache.has_key(key),
+            lambda: cache.touch(key),
+            lambda: cache.delete(key),
+            lambda: cache.delete_many([key]),
+            lambda: cache.set_many({key: 'value'}),
+        )
+        for operation in operations:
+            with self.assertWarns(CacheKeyWarning) as warning:
+                operation()
+            self.assertEqual(str(warning.warning), expected_warning)
+
+    def test_invalid_key_characters(self):
+        key = 'key with spaces and 清'
+        self.perform_invalid_key_test(
+            key,
+            'Cache key contains characters that will cause errors if '
+            'used with memcached: %r' % key,
+        )
+
+    def test_invalid_key_length(self):
+        key = ('a' * 250) + '清'
+        self.perform_invalid_key_test(
+            key,
+            'Cache key will cause errors if used with memcached: '
+            '%r (longer than %s)' % (key, 250),
+        )
+
+    def test_cache_versioning_get_set(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set('answer1', 42)
+        self.assertEqual(cache.get('answer1'), 42)
+        self.assertEqual(cache.get('answer1', version=1), 42)
+        self.assertIsNone(cache.get('answer1', version=2))
+        self.assertIsNone(cache_v2.get('answer1'))
+        self.assertEqual(cache_v2.get('answer1', version=1), 42)
+        cache.set('answer2', 42, version=2)
+        self.assertIsNone(cache.get('answer2'))
+        self.assertEqual(cache.get('answer2', version=2), 42)
+        self.assertEqual(cache_v2.get('answer2'), 42)
+        cache_v2.set('answer3', 42)
+        self.assertIsNone(cache.get('answer3'))
+        self.assertEqual(cache.get('answer3', version=2), 42)
+        cache_v2.set('answer4', 42, version=1)
+        self.assertEqual(cache.get('answer4'), 42)
+        self.assertIsNone(cache_v2.get('answer4'))
+
+    def test_cache_versioning_add(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        self.assertTrue(cache.add('answer1', 42, version=2))
+        self.assertIsNone(cache.get('answer1', version=1))
+        self.assertEqual(cache.get('answer1', version=2), 42)
+        self.assertFalse(cache.add('answer1', 37, version=2))
+        self.assertEqual(cache.get('answer1', version=2), 42)
+        self.assertTrue(cache.add('answer1', 37, version=1))
+        self.assertEqual(cache.get('answer1', version=1), 37)
+        self.assertTrue(cache_v2.add('answer2', 42))
+        self.assertFalse(cache_v2.add('answer2', 37))
+        self.assertIsNone(cache.get('answer2'))
+        self.assertTrue(cache_v2.add('answer2', 37, version=1))
+        self.assertEqual(cache.get('answer2'), 37)
+        self.assertEqual(cache_v2.get('answer2'), 42)
+
+    def test_cache_versioning_has_key(self):
+        self.cache.set('answer1', 42)
+        self.assertTrue(self.cache.has_key('answer1'))
+        self.assertTrue(self.cache.has_key('answer1', version=1))
+        self.assertFalse(self.cache.has_key('answer1', version=2))
+        cache_v2 = self.make_cache(VERSION=2)
+        self.assertFalse(cache_v2.has_key('answer1'))
+        self.assertTrue(cache_v2.has_key('answer1', version=1))
+
+    def test_cache_versioning_delete(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set('answer1', 37, version=1)
+        cache.set('answer1', 42, version=2)
+        cache.delete('answer1')
+        self.assertIsNone(cache.get('answer1', version=1))
+        self.assertEqual(cache.get('answer1', version=2), 42)
+        cache.set('answer2', 37, version=1)
+        cache.set('answer2', 42, version=2)
+        cache_v2.delete('answer2')
+        self.assertEqual(cache.get('answer2', version=1), 37)
+        self.assertIsNone(cache.get('answer2', version=2))
+        cache.set('answer3', 37, version=1)
+        cache.set('answer3', 42, version=2)
+        cache_v2.delete('answer3', version=1)
+        self.assertIsNone(cache.get('answer3', version=1))
+        self.assertEqual(cache.get('answer3', version=2), 42)
+
+    def test_cache_versioning_incr_decr(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set('answer1', 37, version=1)
+        cache.set('answer1', 42, version=2)
+        cache.incr('answer1')
+        self.assertEqual(cache.get('answer1', version=1), 38)
+        self.assertEqual(cache.get('answer1', version=2), 42)
+        cache.decr('answer1')
+        self.assertEqual(cache.get('answer1', version=1), 37)
+        cache.set('answer2', 37, version=1)
+        cache.set('answer2', 42, version=2)
+        cache_v2.incr('answer2')
+        self.assertEqual(cache.get('answer2', version=1), 37)
+        self.assertEqual(cache.get('answer2', version=2), 43)
+        cache_v2.decr('answer2', version=1)
+        self.assertEqual(cache.get('answer2', version=1), 36)
+
+    def test_cache_versioning_get_set_many(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set_many({'ford1': 37, 'arthur1': 42})
+        self.assertEqual(
+            cache.get_many(['ford1', 'arthur1']),
+            {'ford1': 37, 'arthur1': 42},
+        )
+        self.assertEqual(cache.get_many(['ford1', 'arthur1'], version=2), {})
+        self.assertEqual(cache_v2.get_many(['ford1', 'arthur1']), {})
+        cache.set_many({'ford2': 37, 'arthur2': 42}, version=2)
+        self.assertEqual(cache.get_many(['ford2', 'arthur2']), {})
+        self.assertEqual(
+            cache_v2.get_many(['ford2', 'arthur2']),
+            {'ford2': 37, 'arthur2': 42},
+        )
+        cache_v2.delete_many(['ford2'], version=1)
+        self.assertEqual(cache_v2.get('ford2'), 37)
+
+    def test_incr_version(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set('answer', 42, version=2)
+        self.assertIsNone(cache.get('answer'))
+        self.assertEqual(cache.incr_version('answer', version=2), 3)
+        self.assertIsNone(cache.get('answer', version=2))
+        self.assertEqual(cache.get('answer', version=3), 42)
+        cache_v2.set('answer2', 42)
+        self.assertEqual(cache_v2.incr_version('answer2'), 3)
+        self.assertIsNone(cache_v2.get('answer2'))
+        self.assertEqual(cache_v2.get('answer2', version=3), 42)
+        with self.assertRaises(ValueError):
+            cache.incr_version('does_not_exist')
+
+    def test_decr_version(self):
+        cache, cache_v2 = self.cache, self.make_cache(VERSION=2)
+        cache.set('answer', 42, version=2)
+        self.assertEqual(cache.decr_version('answer', version=2), 1)
+        self.assertEqual(cache.get('answer'), 42)
+        self.assertIsNone(cache.get('answer', version=2))
+        cache_v2.set('answer2', 42)
+        self.assertEqual(cache_v2.decr_version('answer2'), 1)
+        self.assertIsNone(cache_v2.get('answer2'))
+        self.assertEqual(cache_v2.get('answer2', version=1), 42)
+        with self.assertRaises(ValueError):
+            cache.decr_version('does_not_exist', version=2)
+
+    def test_custom_key_func(self):
+        custom = self.make_cache(KEY_FUNCTION=custom_key_func)
+        custom2 = self.make_cache(KEY_FUNCTION='core.tests.custom_key_func')
+        self.cache.set('answer1', 42)
+        self.assertIsNone(custom.get('answer1'))
+        custom.set('answer2', 42)
+        self.assertIsNone(self.cache.get('answer2'))
+        self.assertEqual(custom2.get('answer2'), 42)
+
+    def test_add_fail_on_pickleerror(self):
+        with self.assertRaises(pickle.PickleError):
+            self.cache.add('unpicklable', Unpicklable())
+        self.assertFalse(self.cache.has_key('unpicklable'))
+
+    def test_set_fail_on_pickleerror(self):
+        with self.assertRaises(pickle.PickleError):
+            self.cache.set('unpicklable', Unpicklable())
+        with self.assertRaises(pickle.PickleError):
+            self.cache.set_many({'key': 'value', 'unpicklable': Unpicklable()})
+        self.assertFalse(self.cache.has_key('key'), 'set_many откатывается')
+
+    def test_get_or_set(self):
+        self.assertIsNone(self.cache.get('projector'))
+        self.assertEqual(self.cache.get_or_set('projector', 42), 42)
+        self.assertEqual(self.cache.get('projector'), 42)
+        self.assertIsNone(self.cache.get_or_set('null', None))
+
+    def test_get_or_set_callable(self):
+        self.assertEqual(self.cache.get_or_set('mykey', lambda: 'value'),
+                         'value')
+        self.assertEqual(self.cache.get_or_set('mykey', lambda: 'other'),
+                         'value')
+
+    def test_get_or_set_callable_returning_none(self):
+        self.assertIsNone(self.cache.get_or_set('mykey', lambda: None))
+        self.assertEqual(self.cache.get('mykey', 'default'), 'default')
+
+    def test_get_or_set_version(self):
+        cache = self.cache
+        self.assertEqual(cache.get_or_set('brian', 1979, version=2), 1979)
+        with self.assertRaises(TypeError):
+            cache.get_or_set('brian')
+        self.assertIsNone(cache.get('brian', version=1))
+        self.assertEqual(cache.get_or_set('brian', 42, version=1), 42)
+        self.assertEqual(cache.get_or_set('brian', 1979, version=2), 1979)
+        self.assertIsNone(cache.get('brian', version=3))
+
+    def test_get_or_set_racing(self):
+        """add() проиграл гонку — get_or_set() отдаёт значение по
+        умолчанию."""
+        with mock.patch.object(SQLiteCache, 'add', return_value=False):
+            self.assertEqual(self.cache.get_or_set('key', 'default'),
+                             'default')
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+from .cache import bump_tags
+
+logger = logging.getLogger(__name__)
+# Неудачную попытку (например, файла нет) не повторяем на каждом показе
+RETRY_AFTER = 60 * 10
+
+_executor = None
+# Картинки в очереди и теги страниц, ждущих их миниатюр
+_pending = {}
+_lock = threading.Lock()
+
+
+class CacheKVStore(KVStoreBase):
+    """Хранилище метаданных sorl в кэше Django вместо таблицы в БД.
+
+    Фоновые потоки и процессы не пишут в SQLite наперегонки с запросами.
+    Вытесненную запись sorl восстановит по файлу миниатюры; перебора
+    ключей нет, поэтому thumbnail cleanup не поддерживается.
+    """
+    def _get_raw(self, key):
+        return cache.get(key)
+
+    def _set_raw(self, key, value):
+        cache.set(key, value, None)
+
+    def _delete_raw(self, *keys):
+        cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        return []
+
+
+def _key(name, geometry):
+    return f'thumbnail:{geometry}:{name}'
+
+
+def lookup(name, geometry, tags=()):
+    """Готовая миниатюра {'url', 'width', 'height'} или None.
+
+    Никогда не создаёт миниатюру сама: если её нет, ставит создание в
+    очередь, а шаблон показывает заглушку. tags — теги страницы, которую
+    сейчас строят: когда миниатюра будет готова, страницу перерисуют.
+    """
+    if not name:
+        return None
+    thumbnail = cache.get(_key(name, geometry))
+    if thumbnail is None:
+        enqueue(name, *tags)
+        return None
+    return thumbnail or None
+
+
+def render(name):
+    """Создаёт миниатюры всех размеров из THUMBNAIL_GEOMETRIES.
+
+    Возвращает {geometry: миниатюра или {} при ошибке}; в кэш не пишет,
+    поэтому годится и для дочерних процессов.
+    """
+    result = {}
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.items():
+        try:
+            image = get_thumbnail(name, geometry, **options)
+            result[geometry] = {
+                'url': image.url,
+                'width': image.width,
+                'height': image.height,
+            }
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+            result[geometry] = {}
+    return result
+
+
+def store(name, result):
+    """Отмечает миниатюры готовыми для шаблонов."""
+    for geometry, thumbnail in result.items():
+        cache.set(
+            _key(name, geometry), thumbnail,
+            None if thumbnail else RETRY_AFTER,
+        )
+
+
+def is_ready(name):
+    keys = [_key(name, geometry) for geometry in settings.THUMBNAIL_GEOMETRIES]
+    return len(cache.get_many(keys)) == len(keys)
+
+
+def generate(name):
+    store(name, render(name))
+
+
+def _work(name):
+    try:
+        generate(name)
+    finally:
+        with _lock:
+            tags = _pending.pop(name)
+        close_old_connections()
+    # Страницы, закэшированные с заглушкой, пора перерисовать
+    bump_tags(*tags)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def _submit(name, tags):
+    with _lock:
+        if name in _pending:
+            # Уже создаётся: сбросим и теги страниц этого запроса
+            _pending[name].update(tags)
+            return
+        _pending[name] = set(tags)
+    _get_executor().submit(_work, name)
+
+
+def wait_idle(timeout=10):
+    """Ждёт, пока очередь миниатюр опустеет; True, если дождались.
+
+    Для тестов: фоновый поток не должен писать в MEDIA_ROOT, который
+    тест уже удаляет.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _lock:
+            if not _pending:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def enqueue(name, *tags):
+    """Ставит создание миниатюр в очередь после коммита транзакции.
+
+    tags — теги страниц с этой картинкой, их сбросят, когда миниатюры
+    будут готовы.
+    """
+    if name:
+        transaction.on_commit(lambda: _submit(name, tags))
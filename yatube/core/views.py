@@ -1,6 +1,9 @@
 from http import HTTPStatus
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from .profiling import stats
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
@@ -23,3 +26,8 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def request_stats(request):
+    return render(request, 'core/request_stats.html', {'stats': stats()})
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Post
 from .models import Group, Comment
+from .search import matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по индексу FTS5, а не через LIKE '%...%' по всей таблице
+        if not search_term.split():
+            return queryset, False
+        return queryset.filter(id__in=matching_ids(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 
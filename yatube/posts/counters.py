@@ -0,0 +1,87 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+
+def _count(queryset, field, outer='pk'):
+    """Подзапрос: число строк queryset, ссылающихся на внешнюю строку."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя: bump_user(1, posts_count=1).
+
+    Счётчик не уходит ниже нуля: такое расхождение исправит reconcile().
+    """
+    if user_id is None:
+        return
+    floor = {
+        f'{name}__gte': -delta for name, delta in deltas.items() if delta < 0
+    }
+    UserCounters.objects.filter(user_id=user_id, **floor).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+
+
+def bump_comments(post_id, delta):
+    if post_id is None:
+        return
+    Post.objects.filter(
+        pk=post_id, comments_count__gte=-delta
+    ).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def reconcile():
+    """Пересчитывает все счётчики по данным и возвращает число
+    исправленных строк."""
+    missing = User.objects.filter(counters__isnull=True)
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=pk) for pk in missing.values_list(
+            'pk', flat=True
+        )],
+        ignore_conflicts=True,
+    )
+    users = UserCounters.objects.annotate(
+        real_posts=_count(Post.objects, 'author', 'user'),
+        real_followers=_count(Follow.objects, 'author', 'user'),
+        real_following=_count(Follow.objects, 'user', 'user'),
+    ).filter(
+        ~Q(posts_count=F('real_posts'))
+        | ~Q(followers_count=F('real_followers'))
+        | ~Q(following_count=F('real_following'))
+    ).values_list('pk', 'real_posts', 'real_followers', 'real_following')
+    fixed = 0
+    for pk, posts, followers, following in users:
+        UserCounters.objects.filter(pk=pk).update(
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        )
+        fixed += 1
+    posts = Post.objects.annotate(
+        real_comments=_count(Comment.objects, 'post'),
+    ).exclude(
+        comments_count=F('real_comments')
+    ).values_list('pk', 'real_comments')
+    for pk, comments in posts:
+        Post.objects.filter(pk=pk).update(comments_count=comments)
+        fixed += 1
+    return fixed
+
+
+def recount_follows(*user_ids):
+    """Пересчитывает счётчики подписок пользователей одним UPDATE.
+
+    В отличие от bump_user() результат не зависит от того, сколько раз и
+    в каком порядке параллельные запросы подписались и отписались.
+    """
+    UserCounters.objects.filter(user_id__in=user_ids).update(
+        followers_count=_count(Follow.objects, 'author', 'user'),
+        following_count=_count(Follow.objects, 'user', 'user'),
+    )
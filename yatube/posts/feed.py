@@ -0,0 +1,71 @@
+from django.db import connection
+
+from .models import FeedEntry, Follow, Post
+
+# Сколько записей ленты вставляем за один запрос.
+BATCH_SIZE = 500
+
+
+def _bulk_insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, *author_ids):
+    """Добавляет в ленту читателя все посты авторов."""
+    posts = Post.objects.filter(
+        author_id__in=author_ids
+    ).values_list('id', 'author_id', 'pub_date')
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, author_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, *author_ids):
+    """Убирает из ленты читателя посты авторов."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def backfill_since(follow_id):
+    """Заполняет ленты по всем подпискам с id больше follow_id.
+
+    Один INSERT ... SELECT вместо backfill() на каждую подписку: для
+    массовой загрузки данных. Записей этих подписок в лентах быть не
+    должно.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            'ON post.author_id = follow.author_id '
+            'WHERE follow.id > %s AND follow.user_id IS NOT NULL',
+            [follow_id],
+        )
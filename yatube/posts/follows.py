@@ -0,0 +1,68 @@
+from django.db import connection, transaction
+
+from core.cache import bump_tags_on_commit
+
+from . import counters, feed
+from .models import Follow
+
+
+def following_ids(user, author_ids):
+    """id авторов из author_ids, на которых подписан user, одним запросом.
+
+    Для списка постов: following_ids(user, {p.author_id for p in page}).
+    """
+    author_ids = set(author_ids)
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def _changed(user_id, author_ids):
+    counters.recount_follows(user_id, *author_ids)
+    bump_tags_on_commit(
+        f'follows:{user_id}', f'feed:{user_id}', f'author:{user_id}',
+        *(f'author:{author_id}' for author_id in author_ids)
+    )
+
+
+@transaction.atomic
+def follow(user, author_ids):
+    """Подписывает user на авторов.
+
+    Один INSERT, пропускающий уже существующие пары: повторный клик и
+    два параллельных запроса упираются в уникальность (user, author), а
+    не создают дубликат.
+    """
+    author_ids = set(author_ids) - {user.pk}
+    if not author_ids:
+        return
+    Follow.objects.bulk_create(
+        [Follow(user=user, author_id=author_id) for author_id in author_ids],
+        ignore_conflicts=True,
+    )
+    feed.backfill(user.pk, *author_ids)
+    _changed(user.pk, author_ids)
+
+
+@transaction.atomic
+def unfollow(user, author_ids):
+    """Отписывает user от авторов одним DELETE."""
+    author_ids = list(set(author_ids))
+    if not author_ids:
+        return
+    # Не QuerySet.delete(): он сначала выбирает строки и шлёт post_delete
+    # на каждую, так что две параллельные отписки сдвинули бы счётчики
+    # дважды. Счётчики и теги обновляет _changed().
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Follow._meta.db_table} '
+            f'WHERE user_id = %s AND author_id IN ({placeholders})',
+            [user.pk, *author_ids],
+        )
+        deleted = cursor.rowcount
+    if deleted:
+        feed.prune(user.pk, *author_ids)
+        _changed(user.pk, author_ids)
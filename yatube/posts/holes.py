@@ -0,0 +1,45 @@
+from django.template.loader import render_to_string
+
+from core import holes
+
+from .forms import CommentForm
+from .follows import following_ids
+
+
+@holes.register('switcher')
+def switcher(request, calls):
+    return [
+        render_to_string('includes/switcher.html', {tab: True}, request)
+        for tab, in calls
+    ]
+
+
+@holes.register('follow_button')
+def follow_button(request, calls):
+    """{% hole 'follow_button' author.pk author.username ['sm'] %}
+
+    Состояние подписки на всех авторов страницы — одним запросом.
+    """
+    following = following_ids(request.user, [call[0] for call in calls])
+    return [
+        '' if author_id == request.user.pk
+        else render_to_string('includes/follow_button.html', {
+            'username': username,
+            'following': author_id in following,
+            'size': size[0] if size else 'lg',
+        })
+        for author_id, username, *size in calls
+    ]
+
+
+@holes.register('comment_form')
+def comment_form(request, calls):
+    if not request.user.is_authenticated:
+        return [''] * len(calls)
+    return [
+        render_to_string('includes/comment_form.html', {
+            'post_id': post_id,
+            'form': CommentForm(),
+        }, request)
+        for post_id, in calls
+    ]
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.urls import reverse
+
+from core.profiling import percentile
+from posts import urls
+from posts.models import Follow, Post
+
+# Эти страницы меняют данные: их гоняем только с --writes
+WRITES = {'add_comment', 'profile_follow', 'profile_unfollow'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц posts/urls.py через WSGI-приложение: '
+        'пропускная способность и перцентили задержки, сравнение с '
+        'сохранённым JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов к каждой странице.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--only', nargs='*', default=None,
+                            help='Имена URL, например index profile.')
+        parser.add_argument('--writes', action='store_true',
+                            help='Гонять и страницы, меняющие данные.')
+        parser.add_argument('--baseline', default='benchmark.json',
+                            help='Файл с прошлыми результатами.')
+        parser.add_argument('--save', action='store_true',
+                            help='Записать результаты в --baseline.')
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').filter(
+            group__isnull=False
+        ).first()
+        follow = Follow.objects.select_related('user', 'author').first()
+        if post is None or follow is None:
+            raise CommandError(
+                'Нужны посты с группой и подписки: '
+                'manage.py generate_dataset'
+            )
+        self.application = get_wsgi_application()
+        self.cookie = self.login(follow.user)
+
+        results = {}
+        for name, url in self.urls(post, follow, options):
+            # Только POST (например, follow_bulk): GET-замер дал бы
+            # одни 405
+            if self.request(url)[1].startswith('405'):
+                self.stdout.write(f'{name}: не принимает GET, пропущена')
+                continue
+            results[name] = self.run(
+                url, options['requests'], options['concurrency']
+            )
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        self.report(results, baseline)
+        if options['save']:
+            with open(options['baseline'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(f'Сохранено в {options["baseline"]}')
+
+    def urls(self, post, follow, options):
+        kwargs = {
+            'slug': post.group.slug,
+            'username': follow.author.username,
+            'post_id': post.pk,
+        }
+        own_post = Post.objects.filter(author=follow.user).first()
+        for pattern in urls.urlpatterns:
+            name = pattern.name
+            if options['only'] and name not in options['only']:
+                continue
+            if name in WRITES and not options['writes']:
+                continue
+            if name == 'post_edit':
+                if own_post is None:
+                    continue
+                args = {'post_id': own_post.pk}
+            else:
+                args = {
+                    key: kwargs[key] for key in pattern.pattern.converters
+                }
+            url = reverse(f'posts:{name}', kwargs=args)
+            if name == 'search':
+                url += '?' + urlencode({'q': post.text.split()[0]})
+            yield name, url
+
+    def login(self, user):
+        """Cookie сессии пользователя, как после входа на сайт."""
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return f'{settings.SESSION_COOKIE_NAME}={session}'
+
+    def request(self, url):
+        path, _, query = url.partition('?')
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_COOKIE': self.cookie,
+            'wsgi.input': BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        status = []
+        start = time.perf_counter()
+        body = self.application(
+            environ, lambda code, headers: status.append(code)
+        )
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return time.perf_counter() - start, status[0]
+
+    def run(self, url, count, concurrency):
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def work(_):
+            elapsed, status = self.request(url)
+            with lock:
+                latencies.append(elapsed * 1000)
+                if not status.startswith(('2', '3')):
+                    errors.append(status)
+
+        start = time.perf_counter()
+        if concurrency == 1:
+            # Последовательно в этом же потоке и с его соединением с БД
+            for index in range(count):
+                work(index)
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(work, range(count)))
+        wall = time.perf_counter() - start
+        latencies.sort()
+        return {
+            'url': url,
+            'requests': count,
+            'concurrency': concurrency,
+            'errors': len(errors),
+            'rps': count / wall,
+            'p50': percentile(latencies, .5),
+            'p95': percentile(latencies, .95),
+            'p99': percentile(latencies, .99),
+        }
+
+    def report(self, results, baseline):
+        self.stdout.write(
+            f'{"страница":<18}{"rps":>10}{"p50":>10}{"p95":>10}'
+            f'{"p99":>10}{"ошибок":>8}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<18}{row["rps"]:>10.1f}{row["p50"]:>10.1f}'
+                f'{row["p95"]:>10.1f}{row["p99"]:>10.1f}{row["errors"]:>8}'
+            )
+            old = baseline.get(name)
+            if old:
+                self.stdout.write(
+                    f'{"  к прошлому":<18}'
+                    + ''.join(
+                        f'{self.change(row[key], old[key]):>10}'
+                        for key in ('rps', 'p50', 'p95', 'p99')
+                    )
+                )
+
+    @staticmethod
+    def change(new, old):
+        if not old:
+            return '—'
+        return f'{(new - old) / old:+.0%}'
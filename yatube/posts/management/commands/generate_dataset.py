@@ -0,0 +1,265 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from core.cache import bump_tags
+from posts import feed
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+# Готовых текстов хватает, чтобы посты не повторялись на странице,
+# а Faker не тормозил генерацию миллиона строк
+TEXT_POOL = 2000
+
+
+@contextmanager
+def _explicit_dates(*fields):
+    """Даёт bulk_create сохранить свои даты в полях auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок создать для постов.',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов, групп '
+                 'и постов; 0 — равномерно.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты постов.',
+        )
+        parser.add_argument('--batch', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch = options['batch']
+        self.skew = options['skew']
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            groups = self.create_groups(options['groups'])
+            images = self.create_images(options['images'])
+            posts = self.create_posts(
+                options['posts'], users, groups, images,
+                options['image_ratio'], options['days'],
+            )
+            comments = self.create_comments(options['comments'], users, posts)
+            last_follow_id = self._last_id(Follow)
+            follows = self.create_follows(options['follows'], users)
+            self.create_counters(users, posts, follows)
+            feed.backfill_since(last_follow_id)
+        bump_tags('posts')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, групп {len(groups)}, '
+            f'постов {len(posts)}, комментариев {comments}, '
+            f'подписок {len(follows)}'
+        ))
+
+    def popular(self, population, k):
+        """k случайных элементов, первые в population популярнее."""
+        if not population or not k:
+            return []
+        weights = accumulate(
+            1 / (rank ** self.skew) for rank in range(1, len(population) + 1)
+        )
+        return self.random.choices(population, cum_weights=list(weights), k=k)
+
+    def _new_ids(self, model, after):
+        return list(model.objects.filter(pk__gt=after).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def _last_id(self, model):
+        return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def create_users(self, count):
+        mixer = Mixer(commit=False)
+        last_id = self._last_id(User)
+        # Один хэш на всех: make_password на каждого занял бы минуты
+        password = make_password('password')
+        for chunk in _chunks(range(count), self.batch):
+            users = []
+            for index in chunk:
+                user = mixer.blend(User, password=password)
+                user.username = f'{user.username}_{last_id + index}'[:150]
+                users.append(user)
+            User.objects.bulk_create(users)
+        ids = self._new_ids(User, last_id)
+        self.random.shuffle(ids)
+        return ids
+
+    def create_groups(self, count):
+        mixer = Mixer(commit=False)
+        last_id = self._last_id(Group)
+        groups = []
+        for index in range(count):
+            group = mixer.blend(Group)
+            group.slug = f'{group.slug[:40]}-{last_id + index}'
+            groups.append(group)
+        Group.objects.bulk_create(groups)
+        return self._new_ids(Group, last_id)
+
+    def create_images(self, count):
+        names = []
+        for index in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            content = io.BytesIO()
+            Image.new('RGB', (960, 540), color).save(content, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/synthetic_{index}.jpg', ContentFile(content.getvalue())
+            ))
+        return names
+
+    def create_posts(self, count, authors, groups, images, image_ratio, days):
+        """Возвращает [(id, author_id, pub_date)] в порядке создания."""
+        texts = [self.fake.text() for _ in range(min(count, TEXT_POOL))]
+        start = timezone.now() - timedelta(days=days)
+        step = timedelta(days=days) / max(count, 1)
+        last_id = self._last_id(Post)
+        author_ids = self.popular(authors, count)
+        group_ids = self.popular(groups, count)
+        created = []
+        with _explicit_dates(Post._meta.get_field('pub_date')):
+            for chunk in _chunks(range(count), self.batch):
+                posts = [
+                    Post(
+                        text=self.random.choice(texts),
+                        author_id=author_ids[index],
+                        group_id=(
+                            group_ids[index]
+                            if group_ids and self.random.random() < 0.8
+                            else None
+                        ),
+                        image=(
+                            self.random.choice(images)
+                            if images and self.random.random() < image_ratio
+                            else ''
+                        ),
+                        pub_date=start + step * index,
+                    )
+                    for index in chunk
+                ]
+                for post in posts:
+                    post.render_text()
+                Post.objects.bulk_create(posts)
+                created.extend(
+                    (post.author_id, post.pub_date) for post in posts
+                )
+        ids = self._new_ids(Post, last_id)
+        return [
+            (pk, author_id, pub_date)
+            for pk, (author_id, pub_date) in zip(ids, created)
+        ]
+
+    def create_comments(self, count, authors, posts):
+        # Обсуждают в основном свежие посты
+        targets = self.popular(posts[::-1], count)
+        texts = [self.fake.sentence() for _ in range(min(count, TEXT_POOL))]
+        per_post = {}
+        with _explicit_dates(Comment._meta.get_field('created')):
+            for chunk in _chunks(targets, self.batch):
+                Comment.objects.bulk_create([
+                    Comment(
+                        post_id=post_id,
+                        author_id=self.random.choice(authors),
+                        text=self.random.choice(texts),
+                        created=pub_date + timedelta(
+                            minutes=self.random.randrange(60 * 24)
+                        ),
+                    )
+                    for post_id, _, pub_date in chunk
+                ])
+                for post_id, _, _ in chunk:
+                    per_post[post_id] = per_post.get(post_id, 0) + 1
+        # Счётчики обновляем пачками постов с одинаковым числом
+        by_count = {}
+        for post_id, total in per_post.items():
+            by_count.setdefault(total, []).append(post_id)
+        for total, post_ids in by_count.items():
+            for chunk in _chunks(post_ids, 500):
+                Post.objects.filter(pk__in=chunk).update(
+                    comments_count=total
+                )
+        return len(targets)
+
+    def create_follows(self, count, users):
+        """Возвращает [(user_id, author_id)] без повторов."""
+        if len(users) < 2:
+            return []
+        count = min(count, len(users) * (len(users) - 1))
+        pairs = set()
+        while len(pairs) < count:
+            missing = count - len(pairs)
+            for author_id in self.popular(users, missing):
+                user_id = self.random.choice(users)
+                if user_id != author_id:
+                    pairs.add((user_id, author_id))
+        follows = sorted(pairs)
+        for chunk in _chunks(follows, self.batch):
+            Follow.objects.bulk_create([
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in chunk
+            ])
+        return follows
+
+    def create_counters(self, users, posts, follows):
+        counters = {
+            user_id: UserCounters(user_id=user_id) for user_id in users
+        }
+        for _, author_id, _ in posts:
+            counters[author_id].posts_count += 1
+        for user_id, author_id in follows:
+            counters[author_id].followers_count += 1
+            counters[user_id].following_count += 1
+        UserCounters.objects.bulk_create(counters.values())
@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import thumbnails
+from core.cache import bump_tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры картинок постов параллельно на всех ядрах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов (по умолчанию — по числу ядер).',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать и уже готовые миниатюры.',
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).values_list('image', flat=True).distinct()
+        names = [
+            name for name in names
+            if options['force'] or not thumbnails.is_ready(name)
+        ]
+        if names:
+            # Дочерним процессам нельзя делить соединение с родителем
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                results = pool.map(
+                    thumbnails.render, names,
+                    chunksize=max(1, len(names) // (options['workers'] * 4)),
+                )
+                # Кэш может быть локальным для процесса: отмечаем здесь
+                for name, result in zip(names, results):
+                    thumbnails.store(name, result)
+            bump_tags('posts')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names)}'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feed
+from posts.models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок по таблицам Follow и Post.'
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.filter(
+            user__isnull=False, author__isnull=False,
+        ).values_list('user_id', 'author_id')
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            for user_id, author_id in follows.iterator():
+                feed.backfill(user_id, author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'
+        ))
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.http.request import validate_host
+from django.urls import reverse
+
+from core.paginator import CursorPaginator
+from posts.models import Group, Post, User
+
+# Пока прогрев идёт, другие воркеры его не запускают
+LOCK_KEY = 'warm_cache.lock'
+LOCK_TIMEOUT = 60 * 10
+
+
+def allowed_hosts():
+    # Как HttpRequest.get_host(): при DEBUG пустой список разрешает
+    # локальные адреса
+    if settings.DEBUG and not settings.ALLOWED_HOSTS:
+        return ['.localhost', '127.0.0.1', '[::1]']
+    return settings.ALLOWED_HOSTS
+
+
+def default_host():
+    """Первый хост из ALLOWED_HOSTS, годный для заголовка Host.
+
+    '*' и '.example.com' — шаблоны, а не хосты: вместо них берём
+    localhost и example.com. None, если подходящего нет.
+    """
+    allowed = allowed_hosts()
+    for pattern in allowed:
+        host = 'localhost' if pattern == '*' else pattern.lstrip('.')
+        if host and validate_host(host, allowed):
+            return host
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет кэш страниц: первые страницы главной, страницы всех '
+        'групп и профили самых популярных авторов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=3,
+                            help='Сколько страниц главной прогреть.')
+        parser.add_argument('--profiles', type=int, default=20,
+                            help='Сколько профилей по числу подписчиков.')
+        parser.add_argument('--workers', type=int, default=4)
+        host = default_host()
+        parser.add_argument(
+            '--host', default=host, required=host is None,
+            help='Заголовок Host запросов прогрева; должен быть в '
+                 'ALLOWED_HOSTS. В ключ страницы в кэше не входит.',
+        )
+
+    def handle(self, *args, **options):
+        if not validate_host(options['host'], allowed_hosts()):
+            raise CommandError(
+                f'Хоста {options["host"]} нет в ALLOWED_HOSTS'
+            )
+        if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+            self.stdout.write('Прогрев уже идёт в другом процессе')
+            return
+        try:
+            urls = list(self.urls(options['pages'], options['profiles']))
+            self.application = get_wsgi_application()
+            self.host = options['host']
+            if options['workers'] == 1:
+                statuses = [self.request(url) for url in urls]
+            else:
+                with ThreadPoolExecutor(options['workers']) as pool:
+                    statuses = list(pool.map(self.request, urls))
+        finally:
+            cache.delete(LOCK_KEY)
+        failed = [
+            url for url, status in zip(urls, statuses)
+            if not status.startswith('200')
+        ]
+        for url in failed:
+            self.stderr.write(f'Не удалось прогреть {url}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {len(urls) - len(failed)}'
+        ))
+
+    def urls(self, pages, profiles):
+        # Адреса страниц главной — те же курсорные ссылки, по которым
+        # переходят посетители
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        query = ''
+        for number in range(1, pages + 1):
+            yield reverse('posts:index') + (f'?{query}' if query else '')
+            after = parse_qs(query).get('after', [None])[0]
+            page = paginator.get_page(number, after=after)
+            query = page.next_query
+            if not query:
+                break
+        for slug in Group.objects.values_list('slug', flat=True):
+            yield reverse('posts:group_posts', args=(slug,))
+        authors = User.objects.order_by(
+            '-counters__followers_count'
+        ).values_list('username', flat=True)[:profiles]
+        for username in authors:
+            yield reverse('posts:profile', args=(username,))
+
+    def request(self, url):
+        """Анонимный GET через весь стек middleware, как у посетителя."""
+        path, _, query = url.partition('?')
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_HOST': self.host,
+            'wsgi.input': BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        status = []
+        body = self.application(
+            environ, lambda code, headers: status.append(code)
+        )
+        if hasattr(body, 'close'):
+            body.close()
+        return status[0]
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    seen = set()
+    rows = Follow.objects.order_by('pk').values_list(
+        'pk', 'user_id', 'author_id'
+    )
+    for pk, user_id, author_id in rows:
+        if (user_id, author_id) in seen:
+            Follow.objects.filter(pk=pk).delete()
+        seen.add((user_id, author_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        # В 0004_follow поле называлось User, а уникальность была
+        # объявлена на ' user' и в базу не попала
+        migrations.RenameField(
+            model_name='follow',
+            old_name='User',
+            new_name='user',
+        ),
+        migrations.RunPython(
+            drop_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together={('user', 'author')},
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='posts_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='posts_post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='posts_post_group_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created', '-id'], name='posts_comment_post_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='posts_feed_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-id'], name='posts_feed_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 14:20
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [
+        'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+        'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+        'DROP TRIGGER IF EXISTS posts_post_fts_update',
+        'DROP TABLE IF EXISTS posts_post_fts',
+    ]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
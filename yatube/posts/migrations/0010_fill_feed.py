@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+def fill_feed(apps, schema_editor):
+    """Ленты по подпискам, сделанным до появления FeedEntry в 0005.
+
+    Пропускает записи, которые уже есть, поэтому безопасна и для баз,
+    где ленты собраны manage.py rebuild_feed.
+    """
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    feed = FeedEntry._meta.db_table
+    schema_editor.execute(
+        f'INSERT INTO {feed} (user_id, post_id, author_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+        f'FROM {Follow._meta.db_table} follow '
+        f'JOIN {Post._meta.db_table} post '
+        'ON post.author_id = follow.author_id '
+        'WHERE follow.user_id IS NOT NULL AND NOT EXISTS ('
+        f'SELECT 1 FROM {feed} entry '
+        'WHERE entry.user_id = follow.user_id AND entry.post_id = post.id)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_follow_not_self'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
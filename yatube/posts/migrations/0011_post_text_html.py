@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:12
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+# Копия posts.models.render_text на момент миграции: её поведение не
+# должно меняться вместе с моделью
+EXCERPT_LENGTH = 300
+
+
+def render_text(text):
+    text = text or ''
+    return (
+        linebreaks(text, autoescape=True),
+        Truncator(text).chars(EXCERPT_LENGTH),
+    )
+
+
+def fill_text_html(apps, schema_editor):
+    """HTML и анонсы для постов, написанных до появления полей."""
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.only('text').order_by('pk').iterator(chunk_size=500)
+    batch = []
+    for post in posts:
+        post.text_html, post.excerpt = render_text(post.text)
+        batch.append(post)
+        if len(batch) == 500:
+            Post.objects.bulk_update(batch, ['text_html', 'excerpt'])
+            batch = []
+    Post.objects.bulk_update(batch, ['text_html', 'excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_fill_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(default='', editable=False, max_length=300, verbose_name='Анонс'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(default='', editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.RunPython(fill_text_html, migrations.RunPython.noop),
+    ]
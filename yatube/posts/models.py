@@ -1,8 +1,22 @@
 # Create your models here.
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
 
 User = get_user_model()
+# Длина анонса поста в лентах
+EXCERPT_LENGTH = 300
+
+
+def render_text(text):
+    """(HTML текста поста, анонс): считаются при записи, а не в шаблоне
+    на каждый показ."""
+    text = text or ''
+    return (
+        linebreaks(text, autoescape=True),
+        Truncator(text).chars(EXCERPT_LENGTH),
+    )
 
 
 class Group(models.Model):
@@ -44,13 +58,68 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
+    text_html = models.TextField(
+        'Текст в HTML',
+        default='',
+        editable=False,
+    )
+    excerpt = models.CharField(
+        'Анонс',
+        max_length=EXCERPT_LENGTH,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        # Все ленты сортируются по (pub_date, id) под фильтром:
+        # индексы отдают страницу без сортировки во временном B-дереве
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='posts_post_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='posts_post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='posts_post_group_date_idx',
+            ),
+        ]
 
     def __str__(self):
+        # В лентах text не загружается, а анонс начинается так же
+        if 'text' in self.get_deferred_fields():
+            return self.excerpt[:15]
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        self.render_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {
+                *update_fields, 'text_html', 'excerpt'
+            }
+        super().save(*args, **kwargs)
+
+    def render_text(self):
+        """Заполняет text_html и excerpt. save() вызывает её сам, перед
+        bulk_create() её вызывают вручную."""
+        self.text_html, self.excerpt = render_text(self.text)
+
+    @property
+    def cache_tags(self):
+        """Теги закэшированных страниц, на которых виден пост."""
+        from .signals import post_tags
+        return post_tags(self.pk, self.author_id, self.group_id)
+
 
 class Comment(models.Model):
     text = models.TextField()
@@ -73,6 +142,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='posts_comment_post_date_idx',
+            ),
+        ]
         verbose_name = 'Комментарий'
 
     def __str__(self):
@@ -98,7 +173,64 @@ class Follow(models.Model):
     )
 
     class Meta:
-        unique_together = ('author', ' user',)
+        unique_together = ('user', 'author')
+        constraints = [
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='posts_follow_not_self',
+            ),
+        ]
 
     def __str__(self):
         return self.text
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+
+
+class FeedEntry(models.Model):
+    """Запись персональной ленты: пост автора, на которого подписан user."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='posts_feed_user_date_id_idx',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
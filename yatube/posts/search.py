@@ -0,0 +1,86 @@
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+# Внешнее содержимое FTS5: сам текст хранится только в posts_post,
+# индекс синхронизируют триггеры.
+INSTALL_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        text, content='posts_post', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+        AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+        AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+REBUILD_SQL = "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+
+
+def install(connection=connection):
+    """Создаёт индекс и триггеры, если их нет.
+
+    SQLite пересоздаёт таблицу при многих миграциях, и триггеры
+    posts_post пропадают вместе со старой таблицей, поэтому install()
+    вызывается и после каждого migrate.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    if 'posts_post' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+
+
+def rebuild(connection=connection):
+    if connection.vendor != 'sqlite':
+        return
+    install(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_SQL)
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: каждое слово в кавычках
+    ищется по префиксу, все слова обязательны."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in query.split()
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос."""
+    return RawSQL(
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        [match_expression(query)],
+    )
+
+
+def search_posts(query):
+    """Посты по запросу, самые релевантные (bm25) первыми."""
+    if not query.split():
+        return Post.objects.none()
+    if connection.vendor != 'sqlite':
+        return Post.objects.filter(text__icontains=query)
+    return Post.objects.extra(
+        tables=['posts_post_fts'],
+        where=[
+            'posts_post_fts.rowid = posts_post.id',
+            'posts_post_fts MATCH %s',
+        ],
+        params=[match_expression(query)],
+        select={'rank': 'posts_post_fts.rank'},
+        order_by=['rank', '-pub_date'],
+    )
@@ -0,0 +1,124 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_tags_on_commit
+
+from . import counters, feed
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def post_tags(post_id, author_id, *group_ids):
+    """Теги страниц, на которых виден пост."""
+    tags = {'posts', f'author:{author_id}', f'post:{post_id}'}
+    tags.update(
+        f'group:{group_id}' for group_id in group_ids if group_id
+    )
+    return tags
+
+
+def follower_feed_tags(author_id):
+    """Теги лент подписок всех подписчиков автора."""
+    return [
+        f'feed:{user_id}' for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ]
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+    # Пост могли перенести в другую группу: старую тоже надо сбросить
+    instance._old_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    tags = post_tags(
+        instance.pk,
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_old_group_id', None),
+    )
+    if created:
+        feed.fan_out_post(instance)
+        counters.bump_user(instance.author_id, posts_count=1)
+    # Лента подписок показывает автора, дату и группу поста: правка
+    # текста её не меняет, и обходить всех подписчиков не нужно
+    if created or instance._old_group_id != instance.group_id:
+        tags.update(follower_feed_tags(instance.author_id))
+    bump_tags_on_commit(*tags)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    bump_tags_on_commit(
+        *post_tags(instance.pk, instance.author_id, instance.group_id),
+        *follower_feed_tags(instance.author_id),
+    )
+
+
+def _comment_changed(comment):
+    # Число комментариев выводится и в списках постов, но не в ленте
+    # подписок
+    post = Post.objects.filter(pk=comment.post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        bump_tags_on_commit(*post_tags(comment.post_id, *post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+    _comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    _comment_changed(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_tags_on_commit('posts', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+    bump_tags_on_commit(
+        f'follows:{instance.user_id}',
+        f'feed:{instance.user_id}',
+        f'author:{instance.author_id}',
+        f'author:{instance.user_id}',
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    bump_tags_on_commit(
+        f'follows:{instance.user_id}',
+        f'feed:{instance.user_id}',
+        f'author:{instance.author_id}',
+        f'author:{instance.user_id}',
+    )
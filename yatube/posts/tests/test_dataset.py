@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import tempfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from .. import counters
+from ..management.commands import warm_cache
+from ..models import Comment, FeedEntry, Follow, Post, User
+
+
+class DatasetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_dataset', users=30, groups=3, posts=200, comments=300,
+            follows=60, seed=1, batch=50, stdout=io.StringIO(),
+        )
+
+    def test_generated_rows(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 60)
+
+    def test_denormalized_data_consistent(self):
+        """Счётчики и ленты сходятся с данными, хотя сигналы не вызывались."""
+        self.assertEqual(counters.reconcile(), 0)
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list(
+                'author_id', flat=True
+            )
+        )
+        self.assertEqual(FeedEntry.objects.count(), expected)
+
+    def test_benchmark_saves_and_compares_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            call_command(
+                'benchmark', requests=2, concurrency=1, only=['index'],
+                baseline=baseline, save=True, stdout=io.StringIO(),
+            )
+            with open(baseline) as file:
+                results = json.load(file)
+            self.assertEqual(set(results), {'index'})
+            self.assertEqual(results['index']['errors'], 0)
+
+            out = io.StringIO()
+            call_command(
+                'benchmark', requests=2, concurrency=1, only=['index'],
+                baseline=baseline, stdout=out,
+            )
+            self.assertIn('к прошлому', out.getvalue())
+
+    def test_benchmark_skips_post_only_views(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            out = io.StringIO()
+            call_command(
+                'benchmark', requests=2, concurrency=1,
+                only=['index', 'follow_bulk'], baseline=baseline,
+                save=True, stdout=out,
+            )
+            with open(baseline) as file:
+                self.assertEqual(set(json.load(file)), {'index'})
+            self.assertIn('follow_bulk: не принимает GET', out.getvalue())
+
+    def test_warm_cache(self):
+        """После прогрева страницы отдаются из кэша без рендеринга,
+        на каком бы хосте их ни открыли."""
+        cache.clear()
+        out = io.StringIO()
+        call_command(
+            'warm_cache', pages=2, profiles=3, workers=1, host='localhost',
+            stdout=out,
+        )
+        # Две страницы главной, три группы и три профиля
+        self.assertIn('Прогрето страниц: 8', out.getvalue())
+        urls = list(warm_cache.Command().urls(pages=2, profiles=3))
+        self.assertIn('after=', urls[1])
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotIn(
+                    'base.html',
+                    [template.name for template in response.templates],
+                )
+
+    def test_warm_cache_default_host(self):
+        """Хост по умолчанию — настоящее имя из ALLOWED_HOSTS."""
+        cases = [
+            (['example.com', 'localhost'], 'example.com'),
+            (['*'], 'localhost'),
+            (['.example.com'], 'example.com'),
+            ([], None),
+        ]
+        for allowed, host in cases:
+            with self.subTest(allowed=allowed):
+                with override_settings(ALLOWED_HOSTS=allowed, DEBUG=False):
+                    self.assertEqual(warm_cache.default_host(), host)
+        with override_settings(ALLOWED_HOSTS=[], DEBUG=False):
+            with self.assertRaises(CommandError):
+                call_command('warm_cache', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command(
+                'warm_cache', host='evil.example', stdout=io.StringIO()
+            )
+
+    def test_boot_warm_up_logs_errors(self):
+        from yatube import wsgi
+        with mock.patch.object(
+            wsgi, 'call_command', side_effect=CommandError('нет хоста')
+        ):
+            with self.assertLogs('yatube.wsgi', 'ERROR'):
+                wsgi.warm_cache()
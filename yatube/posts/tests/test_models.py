@@ -1,7 +1,17 @@
+import random
+import threading
+import time
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, TransactionTestCase
 
-from posts.models import Group, Post
+from posts import counters, follows
+from posts.models import (
+    EXCERPT_LENGTH, Comment, FeedEntry, Follow, Group, Post, UserCounters,
+)
 
 User = get_user_model()
 
@@ -34,3 +44,142 @@ class PostModelTest(TestCase):
                     str(instance),
                     'Метод __str__ работает некорректно!'
                 )
+
+    def test_text_rendered_on_save(self):
+        """HTML и анонс считаются при записи, HTML экранирован."""
+        post = Post.objects.create(
+            author=self.user, text='<b>Первый</b>\n\nВторой ' + 'я' * 400
+        )
+        self.assertTrue(post.text_html.startswith(
+            '<p>&lt;b&gt;Первый&lt;/b&gt;</p>'
+        ))
+        self.assertEqual(len(post.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(post.text.startswith(post.excerpt[:-1]))
+        post.text = 'Новый текст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Новый текст')
+        self.assertEqual(post.text_html, '<p>Новый текст</p>')
+        deferred = Post.objects.defer('text').get(pk=self.post.pk)
+        self.assertEqual(str(deferred), self.post.text[:15])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_counters_follow_writes(self):
+        """Счётчики обновляются при создании постов, комментариев
+        и подписок."""
+        counters = UserCounters.objects.get(user=self.author)
+        self.post.refresh_from_db()
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(self.post.comments_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        counters.refresh_from_db()
+        self.assertEqual(counters.followers_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_counters исправляет разошедшиеся счётчики."""
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=0)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 1
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+class FollowConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.authors = [
+            User.objects.create_user(username=f'author{index}')
+            for index in range(3)
+        ]
+        for author in self.authors:
+            Post.objects.create(author=author, text='Текст')
+
+    def hammer(self, worker, threads=8):
+        errors = []
+        start = threading.Barrier(threads)
+
+        def run(seed):
+            start.wait(timeout=30)
+            try:
+                worker(random.Random(seed))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        pool = [
+            threading.Thread(target=run, args=(seed,))
+            for seed in range(threads)
+        ]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join(timeout=60)
+        self.assertEqual(errors, [])
+
+    @staticmethod
+    def retry(action, *args):
+        # Тестовая база SQLite в памяти не ждёт снятия блокировки,
+        # а сразу отвечает «table is locked»
+        for _ in range(1000):
+            try:
+                return action(*args)
+            except OperationalError:
+                time.sleep(0.001)
+        return action(*args)
+
+    def test_parallel_follow_and_unfollow_stay_consistent(self):
+        """Параллельные подписки и отписки не создают дубликатов, а
+        счётчики и лента сходятся с таблицей подписок."""
+        def worker(rng):
+            for _ in range(30):
+                action = rng.choice((follows.follow, follows.unfollow))
+                authors = rng.sample(self.authors, rng.randint(1, 3))
+                self.retry(action, self.reader, [a.pk for a in authors])
+
+        self.hammer(worker)
+        followed = set(Follow.objects.filter(
+            user=self.reader
+        ).values_list('author_id', flat=True))
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), len(followed)
+        )
+        self.assertEqual(counters.reconcile(), 0)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.reader
+            ).values_list('author_id', flat=True)),
+            followed,
+        )
+
+    def test_parallel_follow_creates_one_row(self):
+        def worker(rng):
+            for _ in range(20):
+                self.retry(follows.follow, self.reader, [self.authors[0].pk])
+
+        self.hammer(worker)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.authors[0]).followers_count, 1
+        )
+
+    def test_self_follow_rejected_by_database(self):
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.reader, author=self.reader)
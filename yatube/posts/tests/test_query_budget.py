@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.query_budget import QueryBudget
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    """Страницы укладываются в бюджет запросов из posts/urls.py."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+            Comment.objects.create(post=post, author=cls.author, text='Да')
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_every_url_has_budget(self):
+        """Для каждого имени из posts/urls.py задан бюджет."""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(urls.query_budgets))
+
+    def test_pages_fit_query_budget(self):
+        """Число запросов страницы не растёт с числом постов."""
+        post = {'post_id': self.post.id}
+        author = {'username': self.author.username}
+        pages = [
+            ('index', {}, self.reader_client),
+            ('group_posts', {'slug': self.group.slug}, self.reader_client),
+            ('profile', author, self.reader_client),
+            ('post_detail', post, self.reader_client),
+            ('post_create', {}, self.author_client),
+            ('post_edit', post, self.author_client),
+            ('add_comment', post, self.reader_client),
+            ('post_comments', post, self.reader_client),
+            ('search', {}, self.reader_client),
+            ('follow_index', {}, self.reader_client),
+            ('profile_unfollow', author, self.reader_client),
+            ('profile_follow', author, self.reader_client),
+        ]
+        for name, kwargs, client in pages:
+            cache.clear()
+            url = reverse(f'posts:{name}', kwargs=kwargs)
+            params = {'q': 'Пост'} if name == 'search' else {}
+            with self.subTest(name=name):
+                with QueryBudget(urls.query_budgets[name], url):
+                    client.get(url, params)
+        # Стоимость не растёт с числом авторов в списке
+        authors = [
+            User.objects.create_user(username=f'bulk{number}').username
+            for number in range(5)
+        ]
+        url = reverse('posts:follow_bulk')
+        for action in ('follow', 'unfollow'):
+            with self.subTest(name='follow_bulk', action=action):
+                with QueryBudget(urls.query_budgets['follow_bulk'], url):
+                    self.reader_client.post(
+                        url, {'username': authors, 'action': action}
+                    )
@@ -0,0 +1,102 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+# Полный просмотр таблицы: «SCAN posts_post» без «USING ... INDEX»
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)( AS \w+)?$')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент читают диапазон индекса, без полного просмотра
+    таблиц и без сортировки во временном B-дереве."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(25)
+        ])
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Последний'
+        )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'posts_' not in sql:
+                continue
+            for step in self.explain(sql):
+                match = FULL_SCAN.match(step)
+                with self.subTest(url=url, sql=sql):
+                    self.assertFalse(
+                        match and match['table'].startswith('posts_'),
+                        f'Полный просмотр таблицы: {step}',
+                    )
+                    self.assertNotIn('TEMP B-TREE', step)
+        return response
+
+    def test_listing_plans(self):
+        """index, group_posts, profile, follow_index и post_detail
+        обходятся индексами."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            response = self.assert_plans_use_indexes(url)
+            page_obj = response.context.get('page_obj')
+            if page_obj is not None and page_obj.has_next():
+                self.assert_plans_use_indexes(
+                    f'{url}?{page_obj.next_query}'
+                )
+
+    def test_cursor_page_seeks_index(self):
+        """Следующая страница ищется по индексу, а не просмотром."""
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{url}?{first.next_query}')
+        page_sql = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "posts_post"' in query['sql']
+        )
+        plan = self.explain(page_sql)
+        self.assertTrue(
+            any(step.startswith('SEARCH') and 'posts_post_date_idx' in step
+                for step in plan),
+            plan,
+        )
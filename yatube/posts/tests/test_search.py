@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import search_posts
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.rare = Post.objects.create(
+            author=cls.user, text='Кошка спит на окне'
+        )
+        cls.often = Post.objects.create(
+            author=cls.user, text='Кошка, кошка, кошка и ещё кошка'
+        )
+        Post.objects.create(author=cls.user, text='Про собак')
+
+    def test_search_ranks_results(self):
+        """Поиск находит посты по префиксу слова, релевантные первыми."""
+        self.assertEqual(
+            list(search_posts('кошк')), [self.often, self.rare]
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        rare = Post.objects.get(pk=self.rare.pk)
+        rare.text = 'Теперь про попугаев'
+        rare.save()
+        Post.objects.filter(pk=self.often.pk).delete()
+        self.assertEqual(list(search_posts('кошка')), [])
+        self.assertEqual(list(search_posts('попугаев')), [rare])
+
+    def test_rebuild_search_index_command(self):
+        """rebuild_search_index находит изменения в обход триггеров."""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_update')
+            cursor.execute(
+                "UPDATE posts_post SET text = 'Про жирафов' WHERE id = %s",
+                [self.rare.pk],
+            )
+        self.assertEqual(list(search_posts('жираф')), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(list(search_posts('жираф')), [self.rare])
+        self.assertEqual(list(search_posts('окне')), [])
+
+    def test_search_page(self):
+        """Страница /search/ выводит найденные посты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'окне'})
+        self.assertEqual(list(response.context['page_obj']), [self.rare])
+        response = self.client.get(reverse('posts:search'), {'q': '"'})
+        self.assertEqual(len(response.context['page_obj']), 0)
@@ -0,0 +1,91 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import thumbnails
+from core.cache import bump_tags, tags_version
+
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='С картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, страница не ждёт её, а выводит заглушку."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = Client().get(url)
+        self.assertContains(response, 'bg-light')
+        self.assertNotContains(response, '<img class="card-img')
+
+        thumbnails.generate(self.post.image.name)
+        # Страница поста в кэше: фоновая задача сбрасывает её теги
+        bump_tags(*self.post.cache_tags)
+        response = Client().get(url)
+        self.assertContains(response, '<img class="card-img')
+
+    def test_generate_stores_every_geometry(self):
+        self.assertFalse(thumbnails.is_ready(self.post.image.name))
+        thumbnails.generate(self.post.image.name)
+        self.assertTrue(thumbnails.is_ready(self.post.image.name))
+        for geometry in settings.THUMBNAIL_GEOMETRIES:
+            thumbnail = thumbnails.lookup(self.post.image.name, geometry)
+            self.assertTrue(thumbnail['url'].startswith(settings.MEDIA_URL))
+
+    def test_pages_reset_when_thumbnail_ready(self):
+        """Миниатюра, заказанная шаблоном, сбрасывает теги его страницы."""
+        class InlineExecutor:
+            def submit(self, function, *args):
+                function(*args)
+
+        tags = sorted(self.post.cache_tags)
+        version = tags_version(tags)
+        with mock.patch.object(
+            thumbnails, '_get_executor', return_value=InlineExecutor()
+        ), mock.patch.object(
+            thumbnails.transaction, 'on_commit', lambda callback: callback()
+        ):
+            thumbnails.lookup(self.post.image.name, '960x339', tags)
+        self.assertTrue(thumbnails.is_ready(self.post.image.name))
+        self.assertNotEqual(tags_version(tags), version)
+
+    def test_generate_thumbnails_command(self):
+        call_command('generate_thumbnails', workers=1, stdout=io.StringIO())
+        self.assertTrue(thumbnails.is_ready(self.post.image.name))
@@ -1,14 +1,20 @@
 import shutil
 import tempfile
+from io import StringIO
 from http import HTTPStatus
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
-from ..models import Post, Group, Follow
+from .. import views
+from ..models import Comment, FeedEntry, Post, Group, Follow
+from core.cache import DIRTY_COOKIE, page_key
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 User = get_user_model()
@@ -52,6 +58,8 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        # Страницы в кэше общие для всех клиентов
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostPagesTests.user)
         self.follower_client = Client()
@@ -135,6 +143,91 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(response.context['post'].id, self.post.id)
 
+    def test_listings_defer_post_text(self):
+        """Ленты читают анонс, а не полный текст поста."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        sql = '\n'.join(query['sql'] for query in queries)
+        self.assertIn('"posts_post"."excerpt"', sql)
+        self.assertNotIn('"posts_post"."text"', sql)
+        self.assertNotIn('"posts_post"."text_html"', sql)
+
+    def test_comments_paginated(self):
+        """Страница поста выводит первые комментарии, остальные отдаёт
+        подгрузка — HTML-фрагментом или JSON."""
+        total = views.COMMENTS_PER_PAGE + 5
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.follower, text=f'К{number}')
+            for number in range(total)
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        first = list(response.context['comments'])
+        self.assertEqual(len(first), views.COMMENTS_PER_PAGE)
+        comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id}
+        )
+        query = response.context['comments'].next_query
+        self.assertContains(response, f'{comments_url}?{query}'.replace(
+            '&', '&amp;'
+        ))
+        fragment = self.client.get(f'{comments_url}?{query}')
+        self.assertTemplateUsed(fragment, 'includes/comment_list.html')
+        data = self.client.get(f'{comments_url}?{query}&format=json').json()
+        self.assertIsNone(data['next'])
+        ids = [comment.id for comment in first]
+        ids += [comment['id'] for comment in data['comments']]
+        self.assertEqual(
+            ids,
+            list(Comment.objects.filter(post=self.post).order_by(
+                '-created', '-id'
+            ).values_list('id', flat=True)),
+        )
+        self.assertEqual(data['comments'][0]['author'], 'follower')
+        missing = reverse('posts:post_comments', kwargs={'post_id': 0})
+        self.assertEqual(
+            self.client.get(missing).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_author_sees_own_post_at_once(self):
+        """После записи автор получает страницу мимо устаревшей копии."""
+        url = reverse('posts:profile', kwargs={'username': 'Name1'})
+        self.authorized_client.get(url)
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Только что'}
+        )
+        self.assertIn(DIRTY_COOKIE, response.cookies)
+        # Страницу как раз перестраивает другой запрос
+        cache.add(page_key(RequestFactory().get(url)) + '.lock', 1)
+        self.assertContains(self.authorized_client.get(url), 'Только что')
+
+    def test_post_detail_cached(self):
+        """Страница поста из кэша стоит одного запроса; её сбрасывают
+        комментарий и правка поста, но не чужие посты."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        client = Client()
+
+        def rendered():
+            templates = client.get(url).templates
+            return 'posts/post_detail.html' in [t.name for t in templates]
+
+        self.assertTrue(rendered())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(rendered())
+        self.assertEqual(len(queries), 1)
+        Post.objects.create(
+            text='Чужой', author=User.objects.create_user(username='other')
+        )
+        self.assertFalse(rendered())
+        Comment.objects.create(
+            post=self.post, author=self.follower, text='Новый комментарий'
+        )
+        self.assertContains(client.get(url), 'Новый комментарий')
+        self.assertFalse(rendered())
+        self.post.save()
+        self.assertTrue(rendered())
+
     def test_posts_edit_show_correct_context(self):
         """Шаблон create (edit) сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -212,17 +305,174 @@ class PostPagesTests(TestCase):
         self.assertEqual(tested_post.image, self.post.image)
 
     def test_cache_index_page(self):
-        """Проверяем что главная страница кешируется на 20 секунд."""
+        """Главная страница кешируется, а новый пост сбрасывает кеш."""
         response_one = self.authorized_client.get(reverse('posts:index'))
+        # update() не шлёт сигналов: кеш об изменении не узнаёт
+        Post.objects.filter(pk=self.post.pk).update(text='Скрытая правка')
+        response_two = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_one.content, response_two.content)
         Post.objects.create(
             text='Текст тестировки кэша',
             author=self.user,
         )
-        response_two = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response_one.content, response_two.content)
-        cache.clear()
         response_three = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_one.content, response_three.content)
+        self.assertContains(response_three, 'Текст тестировки кэша')
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304 без запросов к БД,
+        пока данные страницы не изменились."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        client = Client()
+        for url in urls:
+            with self.subTest(url=url):
+                etag = client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertLessEqual(len(queries), 1)
+                Post.objects.create(text='Новый', author=self.user)
+                self.post.save()
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_unrelated_posts_keep_etag(self):
+        """Страница группы и профиль сбрасываются только своими постами."""
+        other_author = User.objects.create_user(username='other')
+        other_group = Group.objects.create(title='Другая', slug='other')
+        urls = [
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        client = Client()
+        etags = [client.get(url)['ETag'] for url in urls]
+        Post.objects.create(text='Чужой', author=other_author,
+                            group=other_group)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Свой', author=self.user, group=self.group)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_group_and_profile_pages_follow_post_edits(self):
+        """Перенос поста в другую группу и удаление сбрасывают кэш
+        страниц обеих групп и профиля автора, каждую страницу отдельно."""
+        other_group = Group.objects.create(title='Другая', slug='other')
+        group_url = reverse('posts:group_posts', args=(self.group.slug,))
+        other_url = reverse('posts:group_posts', args=('other',))
+        profile_url = reverse('posts:profile', args=(self.user.username,))
+        for url in (group_url, other_url, profile_url):
+            self.client.get(url)
+            self.client.get(url, {'page': 2})
+        # Копия: объект класса нужен другим тестам нетронутым
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other_group
+        post.save()
+        self.assertNotIn(post, self.client.get(group_url).context['page_obj'])
+        self.assertIn(post, self.client.get(other_url).context['page_obj'])
+        post.delete()
+        for url in (other_url, profile_url):
+            with self.subTest(url=url):
+                page_obj = self.client.get(url).context['page_obj']
+                self.assertEqual(list(page_obj), [])
+                response = self.client.get(url, {'page': 2})
+                self.assertIsNotNone(response.context)
+
+    def test_follow_changes_etag_for_follower_only(self):
+        """Кнопки подписки в ETag: подписка меняет его только у того,
+        кто подписался."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост автора', author=author,
+                            group=self.group)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+        ]
+        etags = [self.follower_client.get(url)['ETag'] for url in urls]
+        other_etags = [
+            self.authorized_client.get(url)['ETag'] for url in urls
+        ]
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        for url, etag, other_etag in zip(urls, etags, other_etags):
+            with self.subTest(url=url):
+                response = self.follower_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=other_etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_cached_page_shared_between_users(self):
+        """Одна копия профиля в кэше на всех, шапка и кнопка подписки
+        у каждого свои."""
+        url = reverse('posts:profile', kwargs={'username': 'Name1'})
+        guest = self.client.get(url)
+        follower = self.follower_client.get(url)
+        self.assertNotIn(
+            'posts/profile.html',
+            [template.name for template in follower.templates],
+        )
+        self.assertContains(guest, 'Войти')
+        self.assertContains(guest, 'подписаться')
+        self.assertNotContains(guest, 'Пользователь:')
+        self.assertContains(follower, 'Пользователь: follower')
+        self.assertContains(follower, 'отписаться')
+        self.assertIn('Cookie', follower['Vary'])
+
+    def test_follow_buttons_on_listing_use_one_query(self):
+        """Кнопки подписки у каждого поста главной — одним запросом."""
+        for index in range(3):
+            Post.objects.create(
+                text='Пост', author=User.objects.create_user(f'author{index}')
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(reverse('posts:index'))
+        follow_queries = [
+            query for query in queries if 'posts_follow' in query['sql']
+        ]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertContains(response, 'отписаться', count=1)
+        self.assertContains(response, 'подписаться', count=3)
+
+    def test_follow_bulk(self):
+        """Подписка и отписка списком; себя и неизвестных пропускаем."""
+        other = User.objects.create_user(username='other')
+        url = reverse('posts:follow_bulk')
+        response = self.follower_client.post(url, {
+            'username': ['Name1', 'other', 'follower', 'nobody'],
+            'action': 'follow',
+        })
+        self.assertEqual(response.json(), {'following': ['Name1', 'other']})
+        self.assertTrue(
+            Follow.objects.filter(user=self.follower, author=other).exists()
+        )
+        response = self.follower_client.post(
+            url, {'username': ['Name1'], 'action': 'unfollow'}
+        )
+        self.assertEqual(response.json(), {'following': []})
+        self.assertEqual(
+            list(self.follower.follower.values_list(
+                'author__username', flat=True
+            )),
+            ['other'],
+        )
+        response = self.follower_client.post(
+            url, {'username': ['Name1'], 'action': 'delete'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
 
     def test_user_can_follow_to_author(self):
         """Тест подписки на автора (posts):
@@ -292,6 +542,75 @@ class PostPagesTests(TestCase):
         context = response.context['page_obj'].object_list
         self.assertNotIn(self.post, context)
 
+    def test_follow_index_cached_per_user(self):
+        """Лента подписок кэшируется у каждого своя и сбрасывается только
+        у подписчиков автора нового поста и у того, кто подписался."""
+        url = reverse('posts:follow_index')
+        other = User.objects.create_user(username='other')
+        other_client = Client()
+        other_client.force_login(other)
+
+        def rendered(client):
+            templates = client.get(url).templates
+            return 'posts/follow.html' in [t.name for t in templates]
+
+        self.assertTrue(rendered(self.follower_client))
+        self.assertTrue(rendered(other_client))
+        self.assertFalse(rendered(self.follower_client), 'копия в кэше')
+        self.assertFalse(rendered(other_client))
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        response = self.follower_client.get(url)
+        self.assertIn(post, response.context['page_obj'].object_list)
+        self.assertFalse(rendered(other_client), 'other не подписан')
+        other_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user.username}
+        ))
+        response = other_client.get(url)
+        self.assertIn(post, response.context['page_obj'].object_list)
+        self.assertFalse(rendered(self.follower_client))
+
+    def test_follow_index_ignores_comments_and_text_edits(self):
+        """Комментарий и правка текста не сбрасывают ленты подписчиков,
+        перенос поста в другую группу — сбрасывает."""
+        url = reverse('posts:follow_index')
+
+        def rendered():
+            templates = self.follower_client.get(url).templates
+            return 'posts/follow.html' in [t.name for t in templates]
+
+        self.assertTrue(rendered())
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertFalse(rendered(), 'копия в кэше')
+        post.group = None
+        post.save()
+        self.assertTrue(rendered())
+
+    def test_feed_entries_follow_subscriptions(self):
+        """Лента подписок заполняется при подписке и новом посте
+        и чистится при отписке."""
+        feed = FeedEntry.objects.filter(user=self.follower)
+        self.assertTrue(feed.filter(post=self.post).exists())
+        new_post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertTrue(feed.filter(post=new_post).exists())
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user}
+        ))
+        self.assertFalse(feed.exists())
+
+    def test_rebuild_feed_command(self):
+        """Команда rebuild_feed восстанавливает ленту по подпискам."""
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user', 'post')),
+            [(self.follower.id, self.post.id)],
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -341,3 +660,41 @@ class PaginatorViewsTest(TestCase):
             )
             # Проверка последний страницы.
             self.assertEqual(number_posts_on_page, second_posts)
+
+    def test_cursor_links_walk_all_posts(self):
+        '''Ссылки «Следующая» и «Предыдущая» обходят все посты.'''
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        first = self.guest_client.get(url).context['page_obj']
+        second = self.guest_client.get(
+            f'{url}?{first.next_query}'
+        ).context['page_obj']
+        self.assertEqual(second.number, 2)
+        self.assertFalse(second.has_next())
+        seen = list(first) + list(second)
+        self.assertEqual(len(set(seen)), len(PaginatorViewsTest.posts))
+        back = self.guest_client.get(
+            f'{url}?{second.previous_query}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_empty_before_cursor_opens_first_page(self):
+        '''Курсор «Предыдущей» новее всех постов ведёт на первую.'''
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        response = self.guest_client.get(
+            url, {'page': 2, 'before': '99999999999999999_1'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), settings.CONSTANT)
+        self.assertIn('after=', page.next_query)
+
+    def test_paginator_does_not_count(self):
+        '''Страница выбирается без COUNT(*) и OFFSET.'''
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        first = self.guest_client.get(url).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(f'{url}?{first.next_query}')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
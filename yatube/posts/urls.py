@@ -11,11 +11,17 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -27,4 +33,24 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow',
     ),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
 ]
+
+# Сколько SQL-запросов может сделать каждая страница на тестовых данных
+# (posts/tests/test_query_budget.py). Рост числа обычно означает N+1
+# в шаблоне или забытый select_related.
+query_budgets = {
+    'index': 4,
+    'group_posts': 6,
+    'profile': 6,
+    'post_detail': 5,
+    'post_create': 5,
+    'post_edit': 4,
+    'add_comment': 5,
+    'post_comments': 4,
+    'search': 4,
+    'follow_index': 3,
+    'profile_follow': 11,
+    'profile_unfollow': 11,
+    'follow_bulk': 9,
+}
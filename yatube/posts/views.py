@@ -1,24 +1,104 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
-from .models import Follow, Post, User, Group, Comment
+from core.paginator import CursorPaginator
+from core.cache import cache_page_tagged, etag_tagged, read_your_writes
+from core import thumbnails
+from .models import Post, User, Group, Comment
+from django.contrib.auth import SESSION_KEY
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from . import follows
 from .forms import PostForm, CommentForm
+from .search import search_posts
+from .signals import post_tags
+
+
+# Сколько авторов можно передать в follow_bulk за раз
+FOLLOW_BULK_LIMIT = 100
+# Ленты выводят анонс: полный текст поста из SQLite не читаем
+LISTING_DEFER = ('text', 'text_html')
+# Комментариев на странице поста и в одной подгрузке
+COMMENTS_PER_PAGE = 20
 
 
 def get_page(queryset, request):
-    paginator = Paginator(queryset, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(queryset, 10)
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     return page_obj
 
 
-@cache_page(20)
+def get_comments_page(post_id, request):
+    """Страница комментариев поста, новые сверху, курсор по (created, id).
+
+    Номер страницы без курсора не принимается: глубокие страницы
+    популярного поста дорого читать через OFFSET.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('text', 'created', 'post_id', 'author__username')
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, keys=('created', 'id'), offset_pages=1
+    )
+    return paginator.get_page(
+        request.GET.get('page'), after=request.GET.get('after')
+    )
+
+
+def index_tags(request):
+    return ['posts']
+
+
+def group_tags(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return None if group_id is None else [f'group:{group_id}']
+
+
+def profile_tags(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return None if author_id is None else [f'author:{author_id}']
+
+
+def follow_tags(request):
+    """Тег подписок посетителя: от них зависят кнопки подписки.
+
+    id берётся из сессии, чтобы условный GET не загружал пользователя.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    return [] if user_id is None else [f'follows:{user_id}']
+
+
+def feed_tags(request):
+    return [f'feed:{request.user.pk}']
+
+
+def post_tags_by_id(request, post_id):
+    """Теги страницы поста. Общего 'posts' среди них нет: чужие посты
+    её не меняют, а счётчики автора и название группы сбрасывают теги
+    author: и group:."""
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    return None if post is None else post_tags(post_id, *post) - {'posts'}
+
+
+@etag_tagged(index_tags, follow_tags)
+@cache_page_tagged(index_tags)
 def index(request):
     posts = Post.objects.all().select_related(
         'group',
         'author',
-    )
+    ).defer(*LISTING_DEFER)
     page_obj = get_page(posts, request)
     context = {
         'page_obj': page_obj,
@@ -26,9 +106,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@etag_tagged(group_tags, follow_tags)
+@cache_page_tagged(group_tags)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().select_related('author')
+    posts = group.posts.all().select_related('author').defer(*LISTING_DEFER)
     page_obj = get_page(posts, request)
     context = {
         'group': group,
@@ -38,37 +120,89 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@etag_tagged(profile_tags, follow_tags)
+@cache_page_tagged(profile_tags)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_post = author.posts.all().select_related('group')
-    page_obj = get_page(author_post, request)
-    following = (
-        request.user.is_authenticated and author.following.filter(
-            user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    author_post = author.posts.all().select_related('group').defer(
+        *LISTING_DEFER
     )
-    if following:
-        following = True
+    page_obj = get_page(author_post, request)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@etag_tagged(post_tags_by_id)
+@cache_page_tagged(post_tags_by_id)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        id=post_id,
+    )
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.select_related('author').filter(post=post)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': get_comments_page(post.id, request),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@etag_tagged(post_tags_by_id)
+def post_comments(request, post_id):
+    """Следующие страницы комментариев для подгрузки на странице поста:
+    HTML-фрагмент или, с ?format=json, JSON."""
+    comments = get_comments_page(post_id, request)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') != 'json':
+        return render(request, 'includes/comment_list.html', {
+            'post_id': post_id,
+            'comments': comments,
+        })
+    next_url = None
+    if comments.has_next():
+        next_url = '{}?{}'.format(
+            reverse('posts:post_comments', args=(post_id,)),
+            comments.next_query,
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created,
+            }
+            for comment in comments
+        ],
+        'next': next_url,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query).select_related('author', 'group').defer(
+        *LISTING_DEFER
+    )
+    # Результаты упорядочены по релевантности, поэтому здесь обычные
+    # номера страниц, а не курсор по дате
+    page_obj = Paginator(posts, 10).get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@read_your_writes
+@transaction.atomic
 def add_comment(request, post_id):
     # Получите пост
     post = get_object_or_404(Post, id=post_id)
@@ -82,6 +216,8 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_your_writes
+@transaction.atomic
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(
@@ -94,6 +230,7 @@ def post_create(request):
             form = form.save(commit=False)
             form.author = request.user
             form.save()
+            thumbnails.enqueue(form.image.name, *form.cache_tags)
             return redirect('posts:profile', request.user.username)
         return render(request, 'posts/create_post.html', context)
     form = PostForm()
@@ -104,10 +241,11 @@ def post_create(request):
 
 
 @login_required
+@read_your_writes
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     is_edit = True
-    if request.user.id == post.author.id:
+    if request.user.id == post.author_id:
         if request.method == 'POST':
             form = PostForm(
                 request.POST or None,
@@ -116,6 +254,7 @@ def post_edit(request, post_id):
             )
             if form.is_valid():
                 post.save()
+                thumbnails.enqueue(post.image.name, *post.cache_tags)
                 return redirect('posts:post_detail', post.id)
             context = {
                 'form': form,
@@ -133,11 +272,16 @@ def post_edit(request, post_id):
 
 
 @login_required
+@cache_page_tagged(feed_tags, per_user=True)
 def follow_index(request):
-    follow_author_posts = Post.objects.filter(
-        author__following__user=request.user)
+    # Лента материализована в FeedEntry: читаем один диапазон индекса
+    entries = request.user.feed_entries.select_related(
+        'post__author',
+        'post__group',
+    ).defer(*(f'post__{field}' for field in LISTING_DEFER))
     # Объявляем страницу с пагинацией
-    page_obj = get_page(follow_author_posts, request)
+    page_obj = get_page(entries, request)
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
@@ -145,16 +289,36 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not follower.exists():
-        Follow.objects.create(user=request.user, author=author)
+    follows.follow(request.user, [author.pk])
     return redirect('posts:profile', author.username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(user=request.user, author=author)
-    if following.exists():
-        following.delete()
+    follows.unfollow(request.user, [author.pk])
     return redirect('posts:profile', username=author)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Подписка или отписка сразу на несколько авторов.
+
+    POST username=...&username=...&action=follow|unfollow, в ответе —
+    на кого из них пользователь теперь подписан.
+    """
+    usernames = request.POST.getlist('username')
+    action = request.POST.get('action')
+    if action not in ('follow', 'unfollow') or not (
+        0 < len(usernames) <= FOLLOW_BULK_LIMIT
+    ):
+        return HttpResponseBadRequest()
+    authors = User.objects.filter(username__in=usernames)
+    getattr(follows, action)(
+        request.user, authors.values_list('pk', flat=True)
+    )
+    following = authors.filter(following__user=request.user)
+    return JsonResponse({'following': sorted(
+        following.values_list('username', flat=True)
+    )})
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.holes.HoleMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -64,7 +68,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени для ProfilingMiddleware
+        'BACKEND': 'core.profiling.ProfiledTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -150,8 +155,35 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файл кэша общий для всех процессов приложения на машине
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 256 * 1024 * 1024,
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# Время жизни страниц и фрагментов с тегами зависимостей: запись в модели
+# сбрасывает их сразу, поэтому TTL может быть большим.
+CACHE_TTL = 60 * 60 * 3
+
+# Тесты пишут в свой временный файл кэша, а не в CACHES выше
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Прогревать кэш страниц при старте WSGI-воркера (manage.py warm_cache)
+WARM_CACHE_ON_BOOT = not DEBUG
+
+# Миниатюры создаются в фоне после загрузки картинки, а шаблоны берут
+# только готовые. Параметры — как у sorl get_thumbnail().
+THUMBNAIL_GEOMETRIES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_KVSTORE = 'core.thumbnails.CacheKVStore'
+
+# Сколько последних запросов на каждое имя URL хранит ProfilingMiddleware
+PROFILING_SAMPLES = 1000
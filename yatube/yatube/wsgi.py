@@ -7,10 +7,30 @@ For more information on this file, see
 https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 """
 
+import logging
 import os
+import threading
 
+from django.conf import settings
+from django.core.management import call_command
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+logger = logging.getLogger(__name__)
+
+
+def warm_cache():
+    try:
+        call_command('warm_cache', verbosity=0)
+    except Exception:
+        # Исключение в потоке иначе пропало бы без следа
+        logger.exception('Прогрев кэша при старте не удался')
+
+
+if settings.WARM_CACHE_ON_BOOT:
+    # Прогреваем кэш в фоне, не задерживая старт воркера; из нескольких
+    # воркеров прогрев выполнит тот, кто первым возьмёт блокировку
+    threading.Thread(target=warm_cache, daemon=True).start()